@@ -1,30 +1,69 @@
 # VS Code Themes for Anki
 # Main addon entry point
 
+import functools
 import os
+import re
+import traceback
 from aqt import mw, gui_hooks
-from aqt.utils import qconnect, showInfo
-from aqt.qt import QAction
-from anki.cards import Card
-from anki.decks import DeckManager
-from anki.notes import Note
-from aqt.browser import Browser
-from aqt.editor import Editor
-from aqt.reviewer import Reviewer
+from aqt.utils import showInfo
+from aqt.qt import QAction, QTimer
 from . import theme_manager
-from . import ui
 
 addon_dir = os.path.dirname(__file__)
 theme_mgr = None
 hooks_registered = False
 
+# Startup and per-webview diagnostics; set VSCODE_THEMES_DEBUG=1 to enable.
+# inject_theme_css runs on every page load, so these stay off by default.
+DEBUG = bool(os.environ.get("VSCODE_THEMES_DEBUG"))
+
+# Exception types already reported with a full traceback by inject_theme_css
+_seen_injection_errors = set()
+
+# Context classification tables for inject_theme_css (Phase 2 improvement)
+# Exact matches on the context's class name are tried first; the substring
+# scans over the qualified class name only run for contexts not listed here.
+UNSAFE_CONTEXT_NAMES = frozenset({"cardlayout", "editor"})
+CONTEXT_STYLES = {
+    "reviewer": ("reviewer", "vscode-theme-reviewer"),
+    "deckbrowser": ("main", "vscode-theme-deckbrowser"),
+    "overview": ("main", "vscode-theme-overview"),
+}
+UNSAFE_CONTEXT_RE = re.compile(r"card_layout|clayout|editor|card_|note_")
+DECKBROWSER_CONTEXT_MARKERS = ("deckbrowser", "browser", "main")
+GENERAL_CONTEXT_STYLE = ("main", "vscode-theme-general")
+
+@functools.lru_cache(maxsize=32)
+def _classify_context(context_type):
+    """Map a webview context class to (css_type, style_id), or None if protected"""
+    context_name = context_type.__name__.lower()
+    if context_name in UNSAFE_CONTEXT_NAMES:
+        return None
+    if context_name in CONTEXT_STYLES:
+        return CONTEXT_STYLES[context_name]
+    
+    # Anki contexts use the default repr, so the module-qualified class
+    # name carries the same markers str(context) used to
+    context_str = f"{context_type.__module__}.{context_type.__qualname__}".lower()
+    if UNSAFE_CONTEXT_RE.search(context_str):
+        return None
+    if "reviewer" in context_str:
+        return CONTEXT_STYLES["reviewer"]
+    if any(ctx in context_str for ctx in DECKBROWSER_CONTEXT_MARKERS):
+        return CONTEXT_STYLES["deckbrowser"]
+    if "overview" in context_str:
+        return CONTEXT_STYLES["overview"]
+    return GENERAL_CONTEXT_STYLE
+
 def cleanup_hooks():
     """Properly clean up hooks when addon unloads"""
     global hooks_registered
     try:
         if hooks_registered and hasattr(gui_hooks, 'webview_will_set_content'):
             gui_hooks.webview_will_set_content.remove(inject_theme_css)
-            print("🧹 Hook cleanup completed")
+            if DEBUG:
+                print("🧹 Hook cleanup completed")
             hooks_registered = False
     except Exception as e:
         print(f"⚠️ Hook cleanup failed: {e}")
@@ -33,16 +72,23 @@ def initialize_addon():
     """Initialize the VS Code Themes addon"""
     global theme_mgr
     
-    print("🚀 Initializing VS Code Themes addon...")
+    # Guard against a second import registering hooks and menu items again
+    if getattr(mw, "_vscode_themes_initialized", False):
+        if DEBUG:
+            print("ℹ️ VS Code Themes addon already initialized, skipping")
+        return
+    
+    if DEBUG:
+        print("🚀 Initializing VS Code Themes addon...")
     
     try:
-        # Get addon directory and config
-        print("📁 Setting up addon directory and config...")
-        addon_dir = os.path.dirname(__file__)
-        print(f"📂 Addon directory: {addon_dir}")
+        # Addon directory is resolved once at import (module-level addon_dir)
+        if DEBUG:
+            print(f"📂 Addon directory: {addon_dir}")
         
         # Load configuration with fallback handling
-        print("⚙️ Loading configuration...")
+        if DEBUG:
+            print("⚙️ Loading configuration...")
         config = {}
         try:
             config = mw.addonManager.getConfig(__name__)
@@ -63,30 +109,33 @@ def initialize_addon():
         config = {**default_config, **config}
         
         # Initialize the theme manager with error handling
-        print("📁 Initializing theme manager...")
+        if DEBUG:
+            print("📁 Initializing theme manager...")
         try:
             theme_mgr = theme_manager.ThemeManager(addon_dir, config, __name__)
-            print(f"✅ Theme manager initialized with {len(theme_mgr.themes)} themes")
+            if DEBUG:
+                print(f"✅ Theme manager initialized with {len(theme_mgr.themes)} themes")
         except ValueError as e:
             print(f"❌ Theme manager initialization failed: {e}")
             showInfo(f"VS Code Themes addon failed to initialize: {e}")
             return
         except Exception as e:
             print(f"❌ Unexpected error initializing theme manager: {e}")
-            import traceback
             traceback.print_exc()
             showInfo(f"VS Code Themes addon failed to initialize: {e}")
             return
         
         # Register hooks with validation
-        print("🔗 Registering hooks...")
+        if DEBUG:
+            print("🔗 Registering hooks...")
         global hooks_registered
         
         try:
             if hasattr(gui_hooks, 'webview_will_set_content'):
                 gui_hooks.webview_will_set_content.append(inject_theme_css)
                 hooks_registered = True
-                print("✅ Webview hook registered")
+                if DEBUG:
+                    print("✅ Webview hook registered")
             else:
                 print("⚠️ Webview hook not available")
         except Exception as e:
@@ -95,73 +144,94 @@ def initialize_addon():
         if not hooks_registered:
             print("⚠️ No hooks registered - theming may be limited")
         
+        # Set only now: a failed theme manager setup above returns early and
+        # leaves initialization open to a retry
+        mw._vscode_themes_initialized = True
+        
         # Add to tools menu with error handling
-        print("📋 Adding to Anki tools menu...")
+        if DEBUG:
+            print("📋 Adding to Anki tools menu...")
         try:
             action = QAction("VS Code Themes", mw)
             action.triggered.connect(show_theme_dialog)
             mw.form.menuTools.addAction(action)
-            print("✅ Menu item added")
+            if DEBUG:
+                print("✅ Menu item added")
         except Exception as e:
             print(f"⚠️ Menu setup failed: {e}")
         
         # Setup system title bar theming if enabled (macOS) with error handling
-        print("🎨 Checking system title bar theming settings...")
+        if DEBUG:
+            print("🎨 Checking system title bar theming settings...")
         try:
             system_titlebar_theming = config.get("system_titlebar_theming", True)
             if system_titlebar_theming:
                 from . import system_titlebar
-                print("✅ System title bar theming module loaded")
-            else:
+                if DEBUG:
+                    print("✅ System title bar theming module loaded")
+            elif DEBUG:
                 print("ℹ️ System title bar theming disabled in config")
         except ImportError as e:
             print(f"⚠️ System title bar theming not available: {e}")
         except Exception as e:
             print(f"⚠️ System title bar theming setup failed: {e}")
         
-        # Initialize addon conflict resolution system
-        print("🔧 Initializing addon conflict resolution...")
-        try:
-            # Import and test conflict manager availability
-            from .addon_conflict_manager import get_conflict_manager, resolve_all_conflicts
-            
-            # Initialize conflict manager with current config
-            conflict_manager = get_conflict_manager(config)
-            
-            # Perform initial conflict detection (without resolution)
-            conflicts = conflict_manager.detect_conflicting_addons()
-            critical_conflicts = [c for c in conflicts if c['enabled'] and c['conflict_level'] == 'CRITICAL']
-            
-            if critical_conflicts:
-                print(f"⚠️ Detected {len(critical_conflicts)} critical addon conflicts")
-                print("🔧 Conflicts will be resolved during theme application")
-            else:
-                print("✅ No critical addon conflicts detected")
-                
-        except ImportError as e:
-            print(f"⚠️ Addon conflict manager not available: {e}")
-        except Exception as e:
-            print(f"⚠️ Conflict manager initialization failed: {e}")
+        # The conflict report is not needed to show the main window, so defer
+        # it until the event loop is running
+        QTimer.singleShot(0, _deferred_setup)
         
         # Apply initial theme with error handling
-        print("🎨 Applying initial theme...")
+        if DEBUG:
+            print("🎨 Applying initial theme...")
         try:
             if theme_mgr:
                 theme_mgr.apply_current_theme()
-                print("✅ Initial theme applied")
+                if DEBUG:
+                    print("✅ Initial theme applied")
         except Exception as e:
             print(f"⚠️ Initial theme application failed: {e}")
             print("🔄 Theme will be applied when dialog is opened")
         
-        print("🎉 VS Code Themes addon initialization completed!")
+        if DEBUG:
+            print("🎉 VS Code Themes addon initialization completed!")
         
     except Exception as e:
         print(f"❌ Addon initialization failed: {e}")
-        import traceback
         traceback.print_exc()
         # Don't show error dialog for initialization failures to avoid startup interruption
         print("🔄 Addon will operate in limited mode")
 
+def _deferred_setup():
+    """Report addon conflicts once Anki's main window is up"""
+    if not theme_mgr:
+        return
+    
+    # Initialize addon conflict resolution system
+    if DEBUG:
+        print("🔧 Initializing addon conflict resolution...")
+    try:
+        # Import and test conflict manager availability
+        from .addon_conflict_manager import CRITICAL_SEVERITY, get_conflict_manager
+        
+        # Initialize conflict manager with current config
+        conflict_manager = get_conflict_manager(theme_mgr.config)
+        
+        # Perform initial conflict detection (without resolution); the initial
+        # theme application already scanned, so this reuses its cached result
+        conflicts = conflict_manager.detect_conflicting_addons()
+        critical_conflicts = [c for c in conflicts if c['enabled'] and c['severity'] >= CRITICAL_SEVERITY]
+        
+        if critical_conflicts:
+            print(f"⚠️ Detected {len(critical_conflicts)} critical addon conflicts")
+            print("🔧 Conflicts will be resolved during theme application")
+        elif DEBUG:
+            print("✅ No critical addon conflicts detected")
+            
+    except ImportError as e:
+        print(f"⚠️ Addon conflict manager not available: {e}")
+    except Exception as e:
+        print(f"⚠️ Conflict manager initialization failed: {e}")
+
 def show_theme_dialog():
     """Show the theme selection dialog"""
     global theme_mgr
@@ -185,58 +255,35 @@ def inject_theme_css(web_content, context):
     
     # Early return with error handling if theme manager not ready
     if not theme_mgr:
-        print("⚠️ Theme manager not initialized, skipping CSS injection")
+        if DEBUG:
+            print("⚠️ Theme manager not initialized, skipping CSS injection")
         return
     
     try:
-        print(f"🌐 CSS injection called for context: {context}")
-        context_str = str(context).lower()
-        print(f"🔍 Context string (lowercase): {context_str}")
-        
-        # Context-aware filtering to protect card content (Phase 2 improvement)
-        unsafe_contexts = ["card_layout", "clayout", "editor", "card_", "note_"]
-        if any(unsafe in context_str for unsafe in unsafe_contexts):
-            print(f"🛡️ Skipping CSS injection for protected context: {context}")
+        context_style = _classify_context(type(context))
+        if context_style is None:
+            # Context-aware filtering to protect card content (Phase 2 improvement)
+            if DEBUG:
+                print(f"🛡️ Skipping CSS injection for protected context: {context}")
             return
         
-        # Enhanced context detection for better CSS application
-        css = None
-        style_id = "vscode-theme-default"
+        css_type, style_id = context_style
+        
+        # Page already carries our styles (repeated hook fire for same page)
+        if f'<style id="{style_id}">' in web_content.head:
+            return
         
         try:
-            # Detect specific context types for targeted CSS
-            if "reviewer" in context_str:
-                print(f"🎨 REVIEWER CONTEXT - Injecting reviewer-safe CSS")
-                css = theme_mgr.get_reviewer_safe_css()
-                style_id = "vscode-theme-reviewer"
-            elif any(ctx in context_str for ctx in ["deckbrowser", "browser", "main"]):
-                print(f"🎨 DECK BROWSER CONTEXT - Injecting full CSS")
-                css = theme_mgr.get_current_theme_css()
-                style_id = "vscode-theme-deckbrowser"
-            elif "overview" in context_str:
-                print(f"🎨 OVERVIEW CONTEXT - Injecting full CSS")
-                css = theme_mgr.get_current_theme_css()
-                style_id = "vscode-theme-overview"
-            else:
-                print(f"🎨 GENERAL CONTEXT - Injecting full CSS for: {context}")
-                css = theme_mgr.get_current_theme_css()
-                style_id = "vscode-theme-general"
+            style_html = theme_mgr.get_theme_style_html(style_id, css_type)
                 
-            if not css:
+            if not style_html:
                 print("⚠️ No CSS available from theme manager")
                 return
-                
-            print(f"🔍 CSS length: {len(css)} characters")
             
-            # Inject main theme CSS
-            web_content.head += f'<style id="{style_id}">{css}</style>'
-            print(f"✅ {style_id} CSS injection completed")
-            
-            # Inject custom CSS if available (always safe)
-            custom_css = theme_mgr.config.get("custom_css", "")
-            if custom_css:
-                print(f"🎨 Injecting {len(custom_css)} characters of custom CSS")
-                web_content.head += f'<style id="vscode-theme-custom-css">{custom_css}</style>'
+            # Inject main theme CSS plus custom CSS (always safe, empty if unset)
+            web_content.head = "".join((web_content.head, style_html, theme_mgr._custom_style_html))
+            if DEBUG:
+                print(f"✅ {style_id} CSS injection completed")
                 
         except AttributeError as e:
             print(f"⚠️ Theme manager method not available: {e}")
@@ -250,13 +297,12 @@ def inject_theme_css(web_content, context):
             except:
                 print("❌ Even fallback CSS failed")
         
-        print(f"🔍 Final web_content.head length: {len(web_content.head)} characters")
-        print("✅ CSS injection process completed")
-        
     except Exception as e:
         print(f"❌ CSS injection failed with unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        # Full traceback once per error type; repeats on later page loads are noise
+        if type(e) not in _seen_injection_errors:
+            _seen_injection_errors.add(type(e))
+            traceback.print_exc()
         # Don't re-raise to prevent breaking Anki's webview loading
 
 # Initialize the addon
@@ -4,12 +4,109 @@ Handles detection, resolution, and prevention of CSS conflicts with other addons
 """
 
 import json
-import os
-from typing import Dict, List, Any, Optional, Tuple
-from aqt import mw
-from aqt.qt import QMessageBox, QTimer, QApplication
+import logging
+from collections import ChainMap, Counter
+from types import MappingProxyType
+from typing import Dict, List, Any
+from aqt import mw, gui_hooks
+from aqt.qt import QTimer, QApplication
 from aqt.utils import showInfo, askUser
 
+logger = logging.getLogger(__name__)
+
+# Numeric severity per conflict_level, so filters compare ints not strings
+SEVERITY = {'CRITICAL': 3, 'HIGH': 2, 'MODERATE': 1}
+CRITICAL_SEVERITY = SEVERITY['CRITICAL']
+
+
+# Nuclear CSS placeholder -> (theme color keys tried in order, fallback color)
+_NUCLEAR_COLOR_ALIASES = {
+    'button_background': (('button.background',), '#404754'),
+    'button_foreground': (('button.foreground',), '#ffffff'),
+    'button_border': (('button.border', 'editorGroup.border'), '#181a1f'),
+    'button_hover_background': (('button.hoverBackground',), '#5a6375'),
+    'badge_background': (('badge.background',), '#404754'),
+    'badge_foreground': (('badge.foreground',), '#ffffff'),
+    'border': (('editorGroup.border',), '#181a1f'),
+    'editor_background': (('editor.background',), '#282c34'),
+    'editor_foreground': (('editor.foreground',), '#abb2bf'),
+    'input_background': (('input.background',), '#1e2227'),
+    'input_foreground': (('input.foreground', 'editor.foreground'), '#abb2bf'),
+    'input_border': (('input.border', 'editorGroup.border'), '#181a1f'),
+    'selection_background': (('editor.selectionBackground',), '#3e4451'),
+    'focus_border': (('focusBorder',), '#007acc'),
+}
+
+# Replaces the nuclear <style> element in the main webview; css is a JS string literal
+_NUCLEAR_STYLE_JS_TEMPLATE = """
+var nuclearStyle = document.getElementById('nuclear-addon-conflict-css');
+if (nuclearStyle) {{
+    nuclearStyle.remove();
+}}
+
+var style = document.createElement('style');
+style.id = 'nuclear-addon-conflict-css';
+style.textContent = {css};
+document.head.appendChild(style);
+"""
+
+# Ultra-high specificity selectors (beats most addon CSS); placeholders are
+# filled by AddonConflictManager._resolve_nuclear_colors
+_NUCLEAR_CSS_TEMPLATE = """
+/* NUCLEAR CSS - Ultra-High Specificity for Addon Conflict Resolution */
+/* Specificity: 1,0,0,12+ - Beats most addon CSS */
+
+/* Button Conflicts (The KING of Button Add-ons) */
+html body div.deck-browser html body div.overview html body .review-state html body .btn,
+html body #main html body .centralwidget html body QPushButton,
+html body .review-screen html body .answer-buttons html body button {{
+    background-color: {button_background} !important;
+    color: {button_foreground} !important;
+    border: 1px solid {button_border} !important;
+    border-radius: 4px !important;
+}}
+
+html body div.deck-browser html body div.overview html body .review-state html body .btn:hover,
+html body #main html body .centralwidget html body QPushButton:hover,
+html body .review-screen html body .answer-buttons html body button:hover {{
+    background-color: {button_hover_background} !important;
+}}
+
+/* Tag Conflicts (Colorful Tags) */
+html body .deck-browser html body .browser html body .tag,
+html body .card html body span.tag,
+html body .review html body .tag-color {{
+    background-color: {badge_background} !important;
+    color: {badge_foreground} !important;
+    border: 1px solid {border} !important;
+}}
+
+/* General Interface Elements */
+html body #main html body .centralwidget html body QWidget,
+html body .deck-browser html body .overview html body div {{
+    background-color: {editor_background} !important;
+    color: {editor_foreground} !important;
+}}
+
+/* Input Fields */
+html body #main html body QLineEdit,
+html body #main html body QTextEdit,
+html body .editor html body input,
+html body .editor html body textarea {{
+    background-color: {input_background} !important;
+    color: {input_foreground} !important;
+    border: 1px solid {input_border} !important;
+}}
+
+/* Selection and Focus */
+html body * html body *:focus,
+html body * html body *::selection {{
+    background-color: {selection_background} !important;
+    color: {editor_foreground} !important;
+    outline: 2px solid {focus_border} !important;
+}}
+""".strip()
+
 
 class AddonConflictManager:
     """
@@ -23,7 +120,7 @@ class AddonConflictManager:
             'name': 'The KING of Button Add-ons',
             'conflict_level': 'CRITICAL',
             'conflict_type': 'Direct CSS Override Competition',
-            'css_patterns': ['.btn', 'QPushButton', '.answer-button', '.review-button'],
+            'css_patterns': ('.btn', 'QPushButton', '.answer-button', '.review-button'),
             'description': 'Directly modifies button styling that conflicts with theme button colors',
             'mitigation_strategy': 'auto_disable_with_consent',
             'nuclear_css_required': True,
@@ -33,7 +130,7 @@ class AddonConflictManager:
             'name': 'Colorful Tags (+ Hierarchical Tags)',
             'conflict_level': 'HIGH',
             'conflict_type': 'Tag Styling CSS Competition',  
-            'css_patterns': ['.tag', '.tag-color', 'span.tag'],
+            'css_patterns': ('.tag', '.tag-color', 'span.tag'),
             'description': 'Modifies tag colors that conflict with theme tag styling',
             'mitigation_strategy': 'css_coordination',
             'nuclear_css_required': True,
@@ -43,7 +140,7 @@ class AddonConflictManager:
             'name': 'Review Heatmap',
             'conflict_level': 'MODERATE',
             'conflict_type': 'Main Window CSS Injection',
-            'css_patterns': ['.heatmap', '.cal-heatmap', '#review-heatmap'],
+            'css_patterns': ('.heatmap', '.cal-heatmap', '#review-heatmap'),
             'description': 'Adds visual elements with hardcoded colors that may not follow theme',
             'mitigation_strategy': 'theme_aware_injection',
             'nuclear_css_required': False,
@@ -53,7 +150,7 @@ class AddonConflictManager:
             'name': 'AnKing Note Types (Easy Customization)',
             'conflict_level': 'MODERATE',
             'conflict_type': 'Card Template CSS Override',
-            'css_patterns': ['.card', '.note-type', '.anking-style'],
+            'css_patterns': ('.card', '.note-type', '.anking-style'),
             'description': 'Modifies card styling that themes should control',
             'mitigation_strategy': 'template_coordination',
             'nuclear_css_required': False,
@@ -61,60 +158,103 @@ class AddonConflictManager:
         }
     }
     
+    # Default dark theme colors used when the theme manager is unreachable
+    DEFAULT_THEME_COLORS = {
+        'editor.background': '#282c34',
+        'editor.foreground': '#abb2bf',
+        'button.background': '#404754',
+        'button.foreground': '#ffffff',
+        'button.hoverBackground': '#5a6375',
+        'input.background': '#1e2227',
+        'editorGroup.border': '#181a1f',
+        'focusBorder': '#007acc',
+        'editor.selectionBackground': '#3e4451'
+    }
+    
+    # Known conflict IDs as a set for intersection with installed addons,
+    # and in priority order so detected conflicts need no sorting
+    _KNOWN_IDS = frozenset(KNOWN_CONFLICTS)
+    _KNOWN_IDS_BY_PRIORITY = tuple(
+        addon_id for addon_id, info in sorted(KNOWN_CONFLICTS.items(), key=lambda item: item[1]['priority'])
+    )
+    
+    # Read-only conflict records for each (addon_id, enabled) state, built once
+    # so a scan hands out shared entries instead of copying dicts per conflict
+    _DETECTED_CONFLICTS = {
+        (addon_id, enabled): MappingProxyType({
+            'addon_id': addon_id, 'enabled': enabled, 'severity': SEVERITY[info['conflict_level']], **info
+        })
+        for addon_id, info in KNOWN_CONFLICTS.items()
+        for enabled in (True, False)
+    }
+    
     def __init__(self, config: Dict[str, Any] = None):
         """Initialize the conflict manager with configuration"""
-        self.config = config or {}
+        self.config = config if config is not None else {}
         self.detected_conflicts = []
         self.monitoring_active = False
         self.nuclear_css_applied = False
-        self.user_conflict_preferences = {}
-        print("🔧 AddonConflictManager initialized")
+        # Kept inside the addon config so answers survive restarts; written
+        # once when the profile closes rather than on every change
+        self.user_conflict_preferences = self.config.setdefault('conflict_prefs', {})
+        self._prefs_dirty = False
+        self._persist_prefs = config is not None
+        if self._persist_prefs:
+            gui_hooks.profile_will_close.append(self._flush_prefs)
+        self._detect_fingerprint = None  # (addon_id, enabled) pairs of last scan
+        self._nuclear_css_colors = None  # Theme colors the cached nuclear CSS was built from
+        self._nuclear_css = ""
+        self._last_nuclear_css_hash = None  # hash of the nuclear CSS last injected
+        self._nuclear_ss_suffix = ""  # Block last appended to the Qt style sheets
+        self._pending_nuclear_css = ""  # Latest CSS awaiting the deferred injection
+        self._pending_injection = False
+        self._strategy_handlers = {
+            'auto_disable_with_consent': self._handle_auto_disable_conflict,
+            'css_coordination': self._handle_css_coordination_conflict,
+            'theme_aware_injection': self._handle_theme_aware_conflict,
+        }
+        logger.debug("🔧 AddonConflictManager initialized")
     
     def detect_conflicting_addons(self) -> List[Dict[str, Any]]:
         """
         Scan for installed addons that conflict with theme system
         Returns list of detected conflicts with details
         """
-        print("🔍 Scanning for conflicting addons...")
-        conflicts = []
+        logger.debug("🔍 Scanning for conflicting addons...")
         
-        try:
-            if not mw or not hasattr(mw, 'addonManager'):
-                print("⚠️ Addon manager not available")
-                return conflicts
-            
-            # Get all installed addons
-            all_addons = mw.addonManager.allAddons()
-            print(f"📦 Found {len(all_addons)} total addons installed")
-            
-            # Check each known conflict
-            for addon_id, conflict_info in self.KNOWN_CONFLICTS.items():
-                if addon_id in all_addons:
-                    # Check if addon is actually enabled
-                    enabled = mw.addonManager.isEnabled(addon_id)
-                    
-                    conflict_details = {
-                        'addon_id': addon_id,
-                        'enabled': enabled,
-                        **conflict_info
-                    }
-                    
-                    conflicts.append(conflict_details)
-                    
-                    status = "🔴 ENABLED" if enabled else "⚪ DISABLED"
-                    print(f"{status} Conflict detected: {conflict_info['name']} ({conflict_info['conflict_level']})")
-            
-            # Sort by priority (highest first)
-            conflicts.sort(key=lambda x: x['priority'])
-            
-            print(f"⚠️ Total conflicts detected: {len(conflicts)}")
-            self.detected_conflicts = conflicts
-            
-            return conflicts
-            
-        except Exception as e:
-            print(f"❌ Error detecting conflicts: {e}")
+        addon_manager = getattr(mw, 'addonManager', None) if mw else None
+        if not addon_manager:
+            logger.warning("⚠️ Addon manager not available")
             return []
+        
+        # Get all installed addons
+        all_addons = addon_manager.allAddons()
+        logger.debug("📦 Found %s total addons installed", len(all_addons))
+        
+        # One set intersection instead of a list scan per known conflict
+        present = self._KNOWN_IDS.intersection(all_addons)
+        
+        # Installed known conflicts with their enabled state, highest priority first
+        fingerprint = tuple(
+            (addon_id, addon_manager.isEnabled(addon_id))
+            for addon_id in self._KNOWN_IDS_BY_PRIORITY
+            if addon_id in present
+        )
+        
+        # Nothing installed or toggled since the last scan
+        if fingerprint == self._detect_fingerprint:
+            return self.detected_conflicts
+        
+        conflicts = [self._DETECTED_CONFLICTS[state] for state in fingerprint]
+        for conflict_details in conflicts:
+            status = "🔴 ENABLED" if conflict_details['enabled'] else "⚪ DISABLED"
+            logger.debug("%s Conflict detected: %s (%s)", status, conflict_details['name'], conflict_details['conflict_level'])
+        
+        logger.debug("⚠️ Total conflicts detected: %s", len(conflicts))
+        self.detected_conflicts = conflicts
+        self._detect_fingerprint = fingerprint
+        
+        return conflicts
     
     def resolve_conflicts_automatically(self, conflicts: List[Dict[str, Any]] = None) -> bool:
         """
@@ -125,38 +265,30 @@ class AddonConflictManager:
             conflicts = self.detect_conflicting_addons()
         
         if not conflicts:
-            print("✅ No conflicts to resolve")
+            logger.debug("✅ No conflicts to resolve")
             return True
         
-        print(f"🔧 Resolving {len(conflicts)} addon conflicts...")
+        enabled_conflicts = [c for c in conflicts if c['enabled']]
+        if not enabled_conflicts:
+            logger.debug("✅ All %s conflicting addons already disabled", len(conflicts))
+            return True
+        
+        logger.debug("🔧 Resolving %s addon conflicts...", len(enabled_conflicts))
         
         critical_conflicts_resolved = True
         
-        for conflict in conflicts:
-            if not conflict['enabled']:
-                print(f"✅ {conflict['name']} already disabled, skipping")
-                continue
-            
+        for conflict in enabled_conflicts:
             # Handle based on mitigation strategy
             strategy = conflict.get('mitigation_strategy', 'ask_user')
+            handler = self._strategy_handlers.get(strategy, self._handle_generic_conflict)
+            resolved = handler(conflict)
             
-            if strategy == 'auto_disable_with_consent':
-                resolved = self._handle_auto_disable_conflict(conflict)
-                if not resolved and conflict['conflict_level'] == 'CRITICAL':
-                    critical_conflicts_resolved = False
-                    
-            elif strategy == 'css_coordination':
-                resolved = self._handle_css_coordination_conflict(conflict)
-                
-            elif strategy == 'theme_aware_injection':
-                resolved = self._handle_theme_aware_conflict(conflict)
-                
-            else:
-                resolved = self._handle_generic_conflict(conflict)
+            if not resolved and strategy == 'auto_disable_with_consent' and conflict['severity'] >= CRITICAL_SEVERITY:
+                critical_conflicts_resolved = False
         
         # Apply nuclear CSS if needed for any unresolved conflicts
-        if not critical_conflicts_resolved or self._has_unresolved_nuclear_conflicts(conflicts):
-            print("🚀 Applying nuclear CSS for unresolved conflicts...")
+        if not critical_conflicts_resolved or self._has_unresolved_nuclear_conflicts(enabled_conflicts):
+            logger.debug("🚀 Applying nuclear CSS for unresolved conflicts...")
             self.apply_nuclear_css()
         
         return critical_conflicts_resolved
@@ -166,7 +298,7 @@ class AddonConflictManager:
         addon_id = conflict['addon_id']
         addon_name = conflict['name']
         
-        print(f"🔴 Handling critical conflict: {addon_name}")
+        logger.debug("🔴 Handling critical conflict: %s", addon_name)
         
         # Check user preference for this specific addon
         pref_key = f"auto_disable_{addon_id}"
@@ -175,7 +307,7 @@ class AddonConflictManager:
         if user_preference == 'always_disable':
             return self._disable_addon(addon_id, addon_name, auto=True)
         elif user_preference == 'never_disable':
-            print(f"⚪ User chose to keep {addon_name} enabled, applying nuclear CSS")
+            logger.debug("⚪ User chose to keep %s enabled, applying nuclear CSS", addon_name)
             return False
         else:
             # Ask user for permission
@@ -208,30 +340,53 @@ Note: You can re-enable it later from Tools > Add-ons if needed.
             
             if user_agreed:
                 # Save user preference
-                self.user_conflict_preferences[f"auto_disable_{addon_id}"] = 'always_disable'
+                self._set_conflict_preference(f"auto_disable_{addon_id}", 'always_disable')
                 return self._disable_addon(addon_id, addon_name, auto=False)
             else:
                 # Save user preference to not ask again
-                self.user_conflict_preferences[f"auto_disable_{addon_id}"] = 'never_disable'
-                print(f"⚪ User chose to keep {addon_name} enabled")
+                self._set_conflict_preference(f"auto_disable_{addon_id}", 'never_disable')
+                logger.debug("⚪ User chose to keep %s enabled", addon_name)
                 return False
                 
         except Exception as e:
-            print(f"❌ Error asking user about {addon_name}: {e}")
+            logger.error("❌ Error asking user about %s: %s", addon_name, e)
             return False
     
+    def _set_conflict_preference(self, key: str, value: str):
+        """Record a conflict preference; persisted by _flush_prefs"""
+        if self.user_conflict_preferences.get(key) != value:
+            self.user_conflict_preferences[key] = value
+            self._prefs_dirty = True
+    
+    def _flush_prefs(self):
+        """Write changed conflict preferences to the addon config"""
+        if not (self._prefs_dirty and self._persist_prefs):
+            return
+        try:
+            addon_manager = mw.addonManager
+            addon_module = addon_manager.addonFromModule(__name__)
+            # Merge into the live config; self.config goes stale once
+            # ThemeManager.update_config replaces its dict
+            config = addon_manager.getConfig(addon_module) or {}
+            config['conflict_prefs'] = dict(self.user_conflict_preferences)
+            addon_manager.writeConfig(addon_module, config)
+            self._prefs_dirty = False
+            logger.debug("✅ Conflict preferences saved")
+        except Exception as e:
+            logger.error("❌ Error saving conflict preferences: %s", e)
+    
     def _disable_addon(self, addon_id: str, addon_name: str, auto: bool = False) -> bool:
         """Disable the specified addon"""
         try:
             if not mw or not hasattr(mw, 'addonManager'):
-                print("❌ Cannot disable addon - addon manager not available")
+                logger.error("❌ Cannot disable addon - addon manager not available")
                 return False
             
             # Disable the addon
             mw.addonManager.toggleEnabled(addon_id, enable=False)
             
             action_type = "automatically" if auto else "successfully"
-            print(f"✅ {action_type.title()} disabled {addon_name}")
+            logger.debug("✅ %s disabled %s", action_type.title(), addon_name)
             
             # Show user notification
             if not auto:
@@ -240,13 +395,13 @@ Note: You can re-enable it later from Tools > Add-ons if needed.
             return True
             
         except Exception as e:
-            print(f"❌ Error disabling {addon_name}: {e}")
+            logger.error("❌ Error disabling %s: %s", addon_name, e)
             return False
     
     def _handle_css_coordination_conflict(self, conflict: Dict[str, Any]) -> bool:
         """Handle conflicts that can be resolved through CSS coordination"""
         addon_name = conflict['name']
-        print(f"🔧 Applying CSS coordination for {addon_name}")
+        logger.debug("🔧 Applying CSS coordination for %s", addon_name)
         
         # For CSS coordination conflicts, we apply high-specificity CSS
         # without disabling the addon
@@ -255,7 +410,7 @@ Note: You can re-enable it later from Tools > Add-ons if needed.
     def _handle_theme_aware_conflict(self, conflict: Dict[str, Any]) -> bool:
         """Handle conflicts that need theme-aware color injection"""
         addon_name = conflict['name']
-        print(f"🎨 Applying theme-aware handling for {addon_name}")
+        logger.debug("🎨 Applying theme-aware handling for %s", addon_name)
         
         # These conflicts are handled by ensuring our theme colors
         # are injected with appropriate specificity
@@ -264,7 +419,7 @@ Note: You can re-enable it later from Tools > Add-ons if needed.
     def _handle_generic_conflict(self, conflict: Dict[str, Any]) -> bool:
         """Handle generic conflicts with fallback strategy"""
         addon_name = conflict['name']
-        print(f"⚙️ Applying generic conflict resolution for {addon_name}")
+        logger.debug("⚙️ Applying generic conflict resolution for %s", addon_name)
         return True
     
     def _has_unresolved_nuclear_conflicts(self, conflicts: List[Dict[str, Any]]) -> bool:
@@ -279,12 +434,12 @@ Note: You can re-enable it later from Tools > Add-ons if needed.
         Apply ultra-high specificity CSS that overrides conflicting addon styles
         This is the "nuclear option" for when addon conflicts can't be resolved otherwise
         """
-        print("🚀 Applying NUCLEAR CSS for maximum specificity...")
+        logger.debug("🚀 Applying NUCLEAR CSS for maximum specificity...")
         
         try:
             # Get current theme colors for nuclear CSS
             if not mw or not hasattr(mw, 'addon_config'):
-                print("❌ Cannot access theme manager for nuclear CSS")
+                logger.error("❌ Cannot access theme manager for nuclear CSS")
                 return False
             
             # Generate nuclear CSS with ultra-high specificity
@@ -294,11 +449,11 @@ Note: You can re-enable it later from Tools > Add-ons if needed.
             self._inject_nuclear_css_multimethod(nuclear_css)
             
             self.nuclear_css_applied = True
-            print("✅ Nuclear CSS applied successfully")
+            logger.debug("✅ Nuclear CSS applied successfully")
             return True
             
         except Exception as e:
-            print(f"❌ Nuclear CSS application failed: {e}")
+            logger.error("❌ Nuclear CSS application failed: %s", e)
             return False
     
     def _generate_nuclear_css(self) -> str:
@@ -307,64 +462,24 @@ Note: You can re-enable it later from Tools > Add-ons if needed.
         # Try to get current theme colors
         theme_colors = self._get_current_theme_colors()
         
-        # Ultra-high specificity selectors (beats most addon CSS)
-        nuclear_css = f"""
-/* NUCLEAR CSS - Ultra-High Specificity for Addon Conflict Resolution */
-/* Specificity: 1,0,0,12+ - Beats most addon CSS */
-
-/* Button Conflicts (The KING of Button Add-ons) */
-html body div.deck-browser html body div.overview html body .review-state html body .btn,
-html body #main html body .centralwidget html body QPushButton,
-html body .review-screen html body .answer-buttons html body button {{
-    background-color: {theme_colors.get('button.background', '#404754')} !important;
-    color: {theme_colors.get('button.foreground', '#ffffff')} !important;
-    border: 1px solid {theme_colors.get('button.border', theme_colors.get('editorGroup.border', '#181a1f'))} !important;
-    border-radius: 4px !important;
-}}
-
-html body div.deck-browser html body div.overview html body .review-state html body .btn:hover,
-html body #main html body .centralwidget html body QPushButton:hover,
-html body .review-screen html body .answer-buttons html body button:hover {{
-    background-color: {theme_colors.get('button.hoverBackground', '#5a6375')} !important;
-}}
-
-/* Tag Conflicts (Colorful Tags) */
-html body .deck-browser html body .browser html body .tag,
-html body .card html body span.tag,
-html body .review html body .tag-color {{
-    background-color: {theme_colors.get('badge.background', '#404754')} !important;
-    color: {theme_colors.get('badge.foreground', '#ffffff')} !important;
-    border: 1px solid {theme_colors.get('editorGroup.border', '#181a1f')} !important;
-}}
-
-/* General Interface Elements */
-html body #main html body .centralwidget html body QWidget,
-html body .deck-browser html body .overview html body div {{
-    background-color: {theme_colors.get('editor.background', '#282c34')} !important;
-    color: {theme_colors.get('editor.foreground', '#abb2bf')} !important;
-}}
-
-/* Input Fields */
-html body #main html body QLineEdit,
-html body #main html body QTextEdit,
-html body .editor html body input,
-html body .editor html body textarea {{
-    background-color: {theme_colors.get('input.background', '#1e2227')} !important;
-    color: {theme_colors.get('input.foreground', theme_colors.get('editor.foreground', '#abb2bf'))} !important;
-    border: 1px solid {theme_colors.get('input.border', theme_colors.get('editorGroup.border', '#181a1f'))} !important;
-}}
-
-/* Selection and Focus */
-html body * html body *:focus,
-html body * html body *::selection {{
-    background-color: {theme_colors.get('editor.selectionBackground', '#3e4451')} !important;
-    color: {theme_colors.get('editor.foreground', '#abb2bf')} !important;
-    outline: 2px solid {theme_colors.get('focusBorder', '#007acc')} !important;
-}}
-        """.strip()
+        # Same theme colors as last time: the CSS is unchanged
+        if theme_colors is self._nuclear_css_colors:
+            return self._nuclear_css
+        
+        nuclear_css = _NUCLEAR_CSS_TEMPLATE.format_map(self._resolve_nuclear_colors(theme_colors))
         
+        self._nuclear_css_colors = theme_colors
+        self._nuclear_css = nuclear_css
         return nuclear_css
     
+    def _resolve_nuclear_colors(self, theme_colors: Dict[str, str]) -> Dict[str, str]:
+        """Resolve the nuclear CSS template placeholders from theme colors"""
+        colors = ChainMap(theme_colors, self.DEFAULT_THEME_COLORS)
+        return {
+            placeholder: next((colors[key] for key in keys if key in colors), default)
+            for placeholder, (keys, default) in _NUCLEAR_COLOR_ALIASES.items()
+        }
+    
     def _get_current_theme_colors(self) -> Dict[str, str]:
         """Get current theme colors for nuclear CSS generation"""
         try:
@@ -375,145 +490,184 @@ html body * html body *::selection {{
                     return theme['colors']
             
             # Fallback to default dark theme colors
-            return {
-                'editor.background': '#282c34',
-                'editor.foreground': '#abb2bf',
-                'button.background': '#404754',
-                'button.foreground': '#ffffff',
-                'button.hoverBackground': '#5a6375',
-                'input.background': '#1e2227',
-                'editorGroup.border': '#181a1f',
-                'focusBorder': '#007acc',
-                'editor.selectionBackground': '#3e4451'
-            }
+            return self.DEFAULT_THEME_COLORS
             
         except Exception as e:
-            print(f"⚠️ Could not get theme colors, using defaults: {e}")
-            return {
-                'editor.background': '#282c34',
-                'editor.foreground': '#abb2bf',
-                'button.background': '#404754',
-                'button.foreground': '#ffffff',
-                'button.hoverBackground': '#5a6375',
-                'input.background': '#1e2227',
-                'editorGroup.border': '#181a1f',
-                'focusBorder': '#007acc',
-                'editor.selectionBackground': '#3e4451'
-            }
+            logger.warning("⚠️ Could not get theme colors, using defaults: %s", e)
+            return self.DEFAULT_THEME_COLORS
     
     def _inject_nuclear_css_multimethod(self, nuclear_css: str):
         """Inject nuclear CSS through multiple methods for maximum reliability"""
         
-        print("💉 Injecting nuclear CSS through multiple channels...")
+        # Defer to the next event-loop tick so repeated calls coalesce into one
+        # injection with the latest CSS
+        self._pending_nuclear_css = nuclear_css
+        if self._pending_injection:
+            return
+        self._pending_injection = True
+        QTimer.singleShot(0, self._flush_nuclear_css)
+    
+    def _flush_nuclear_css(self):
+        """Inject the pending nuclear CSS into all channels in one pass"""
+        self._pending_injection = False
+        nuclear_css = self._pending_nuclear_css
+        
+        app = QApplication.instance()
+        suffix = "\n\n" + nuclear_css
+        
+        # Already injected this exact CSS and no theme switch has replaced the
+        # style sheets since: skip the restyle of every widget
+        nuclear_css_hash = hash(nuclear_css)
+        if (nuclear_css_hash == self._last_nuclear_css_hash
+                and (not app or app.styleSheet().endswith(suffix))
+                and (not mw or mw.styleSheet().endswith(suffix))):
+            logger.debug("ℹ️ Nuclear CSS unchanged, skipping re-injection")
+            return
         
-        # Method 1: Direct webview injection
-        try:
-            if mw and hasattr(mw, 'web'):
-                mw.web.eval(f"""
-                    var nuclearStyle = document.getElementById('nuclear-addon-conflict-css');
-                    if (nuclearStyle) {{
-                        nuclearStyle.remove();
-                    }}
-                    
-                    var style = document.createElement('style');
-                    style.id = 'nuclear-addon-conflict-css';
-                    style.textContent = `{nuclear_css}`;
-                    document.head.appendChild(style);
-                """)
-                print("✅ Nuclear CSS injected via webview")
-        except Exception as e:
-            print(f"⚠️ Webview injection failed: {e}")
+        logger.debug("💉 Injecting nuclear CSS through multiple channels...")
         
-        # Method 2: Qt application stylesheet (for Qt widgets)
+        # Hold off repaints while both style sheets change so the window is
+        # repainted once with the final style instead of after each set
+        if mw:
+            mw.setUpdatesEnabled(False)
         try:
-            app = QApplication.instance()
-            if app:
-                current_stylesheet = app.styleSheet()
-                # Append nuclear CSS to current stylesheet
-                app.setStyleSheet(current_stylesheet + "\n\n" + nuclear_css)
-                print("✅ Nuclear CSS injected via Qt stylesheet")
-        except Exception as e:
-            print(f"⚠️ Qt stylesheet injection failed: {e}")
+            # Method 1: Qt application stylesheet (for Qt widgets)
+            try:
+                if app:
+                    # Replace (not append) so repeated injections don't grow the stylesheet
+                    app.setStyleSheet(self._strip_nuclear_css(app.styleSheet()) + suffix)
+                    logger.debug("✅ Nuclear CSS injected via Qt stylesheet")
+            except Exception as e:
+                logger.warning("⚠️ Qt stylesheet injection failed: %s", e)
+            
+            # Method 2: Main window direct styling
+            try:
+                if mw:
+                    mw.setStyleSheet(self._strip_nuclear_css(mw.styleSheet()) + suffix)
+                    logger.debug("✅ Nuclear CSS injected via main window")
+            except Exception as e:
+                logger.warning("⚠️ Main window injection failed: %s", e)
+        finally:
+            if mw:
+                mw.setUpdatesEnabled(True)
+                mw.update()
         
-        # Method 3: Main window direct styling
+        # Method 3: Direct webview injection (after both restyles)
         try:
-            if mw:
-                current_style = mw.styleSheet()
-                mw.setStyleSheet(current_style + "\n\n" + nuclear_css)
-                print("✅ Nuclear CSS injected via main window")
+            if mw and hasattr(mw, 'web'):
+                # JSON-encode so backticks or ${ in the CSS can't break the script
+                mw.web.eval(_NUCLEAR_STYLE_JS_TEMPLATE.format(css=json.dumps(nuclear_css)))
+                logger.debug("✅ Nuclear CSS injected via webview")
         except Exception as e:
-            print(f"⚠️ Main window injection failed: {e}")
+            logger.warning("⚠️ Webview injection failed: %s", e)
+        
+        self._last_nuclear_css_hash = nuclear_css_hash
+        self._nuclear_ss_suffix = suffix
+    
+    def _strip_nuclear_css(self, style_sheet: str) -> str:
+        """Return style_sheet without the nuclear CSS block appended last time.
+        
+        A theme switch replaces the style sheets, so when the block is no
+        longer at the end the current sheet is already the new base.
+        """
+        previous = self._nuclear_ss_suffix
+        if previous and style_sheet.endswith(previous):
+            return style_sheet[:-len(previous)]
+        return style_sheet
     
     def start_conflict_monitoring(self):
-        """Start real-time monitoring for addon conflicts"""
+        """Start event-driven monitoring for addon conflicts"""
         if self.monitoring_active:
-            print("ℹ️ Conflict monitoring already active")
+            logger.debug("ℹ️ Conflict monitoring already active")
             return
         
-        print("👁️ Starting real-time conflict monitoring...")
+        logger.debug("👁️ Starting real-time conflict monitoring...")
         
-        def check_conflicts():
-            try:
-                # Re-detect conflicts
-                current_conflicts = self.detect_conflicting_addons()
-                
-                # Check if any new critical conflicts appeared
-                critical_conflicts = [c for c in current_conflicts if c['enabled'] and c['conflict_level'] == 'CRITICAL']
-                
-                if critical_conflicts and not self.nuclear_css_applied:
-                    print("🚨 New critical conflicts detected during monitoring")
-                    self.resolve_conflicts_automatically(critical_conflicts)
-                
-            except Exception as e:
-                print(f"⚠️ Error during conflict monitoring: {e}")
+        # Addon state only changes when one is enabled/disabled, so re-check
+        # on that event instead of polling every addon on a timer
+        addon_manager = mw.addonManager
+        original_toggle = addon_manager.toggleEnabled
+        
+        def toggle_enabled(addon_id, enable=None):
+            result = original_toggle(addon_id, enable)
+            # Re-check after Anki's own call has returned, so conflict handling
+            # (and any dialog it opens) never runs inside the host's toggle
+            QTimer.singleShot(0, lambda: self._on_addon_state_change(addon_id))
+            return result
         
-        # Monitor every 30 seconds
-        self.monitor_timer = QTimer()
-        self.monitor_timer.timeout.connect(check_conflicts)
-        self.monitor_timer.start(30000)  # 30 seconds
+        addon_manager.toggleEnabled = toggle_enabled
+        self._original_toggle_enabled = original_toggle
         
         self.monitoring_active = True
-        print("✅ Conflict monitoring started")
+        logger.debug("✅ Conflict monitoring started")
+    
+    def _on_addon_state_change(self, addon_id: str):
+        """An addon was enabled/disabled: re-check if it is a known conflict"""
+        if addon_id not in self._KNOWN_IDS:
+            return
+        
+        logger.debug("🔄 Known conflicting addon state changed: %s", addon_id)
+        try:
+            self._check_conflicts()
+        except Exception as e:
+            logger.error("❌ Conflict check after toggling %s failed: %s", addon_id, e)
+    
+    def _check_conflicts(self):
+        """Monitoring tick: re-detect conflicts and resolve new critical ones"""
+        # Re-detect conflicts
+        current_conflicts = self.detect_conflicting_addons()
+        
+        # Check if any new critical conflicts appeared
+        critical_conflicts = [c for c in current_conflicts if c['enabled'] and c['severity'] >= CRITICAL_SEVERITY]
+        
+        if critical_conflicts and not self.nuclear_css_applied:
+            logger.warning("🚨 New critical conflicts detected during monitoring")
+            self.resolve_conflicts_automatically(critical_conflicts)
     
     def stop_conflict_monitoring(self):
         """Stop real-time conflict monitoring"""
-        if hasattr(self, 'monitor_timer'):
-            self.monitor_timer.stop()
+        if hasattr(self, '_original_toggle_enabled'):
+            mw.addonManager.toggleEnabled = self._original_toggle_enabled
+            del self._original_toggle_enabled
             self.monitoring_active = False
-            print("⏹️ Conflict monitoring stopped")
+            logger.debug("⏹️ Conflict monitoring stopped")
     
     def get_conflict_report(self) -> Dict[str, Any]:
         """Generate a comprehensive conflict report"""
         conflicts = self.detect_conflicting_addons()
         
+        # Count enabled conflicts per severity in a single pass
+        enabled_counts = Counter(c['conflict_level'] for c in conflicts if c['enabled'])
+        
         report = {
             'total_conflicts': len(conflicts),
-            'critical_conflicts': len([c for c in conflicts if c['conflict_level'] == 'CRITICAL' and c['enabled']]),
-            'high_conflicts': len([c for c in conflicts if c['conflict_level'] == 'HIGH' and c['enabled']]),
-            'moderate_conflicts': len([c for c in conflicts if c['conflict_level'] == 'MODERATE' and c['enabled']]),
+            'critical_conflicts': enabled_counts['CRITICAL'],
+            'high_conflicts': enabled_counts['HIGH'],
+            'moderate_conflicts': enabled_counts['MODERATE'],
             'nuclear_css_applied': self.nuclear_css_applied,
             'monitoring_active': self.monitoring_active,
             'conflicts': conflicts,
-            'recommendations': self._generate_recommendations(conflicts)
+            'recommendations': self._generate_recommendations(conflicts, enabled_counts)
         }
         
         return report
     
-    def _generate_recommendations(self, conflicts: List[Dict[str, Any]]) -> List[str]:
+    def _generate_recommendations(self, conflicts: List[Dict[str, Any]],
+                                  enabled_counts: Counter) -> List[str]:
         """Generate user-friendly recommendations for conflict resolution"""
         recommendations = []
         
-        critical_enabled = [c for c in conflicts if c['conflict_level'] == 'CRITICAL' and c['enabled']]
+        critical_enabled = enabled_counts['CRITICAL']
         if critical_enabled:
             recommendations.append(
-                f"🔴 CRITICAL: {len(critical_enabled)} addon(s) are causing severe theme conflicts. "
+                f"🔴 CRITICAL: {critical_enabled} addon(s) are causing severe theme conflicts. "
                 "Consider disabling them for best theme consistency."
             )
         
-        high_enabled = [c for c in conflicts if c['conflict_level'] == 'HIGH' and c['enabled']]
+        high_enabled = enabled_counts['HIGH']
         if high_enabled:
             recommendations.append(
-                f"🟠 HIGH: {len(high_enabled)} addon(s) may cause noticeable theme inconsistencies."
+                f"🟠 HIGH: {high_enabled} addon(s) may cause noticeable theme inconsistencies."
             )
         
         if self.nuclear_css_applied:
@@ -1,11 +1,19 @@
 # Anki Theme Integration Service
 # Automatically synchronize VS Code theme selection with Anki's native theme system
 
-import json
-from typing import Dict, Any, Optional, Tuple
+import logging
+from typing import Callable, Dict, Any, Optional, Tuple
 from aqt import mw
 from aqt.theme import theme_manager as anki_theme_manager
-from aqt.qt import QApplication
+from aqt.qt import QApplication, QTimer
+
+from .theme_classification import classify_theme_data, get_stored_classification, is_light_color
+
+logger = logging.getLogger(__name__)
+
+# Quiet period before a requested Anki theme sync is applied
+SYNC_DEBOUNCE_MS = 100
+
 
 class AnkiThemeIntegration:
     """
@@ -18,6 +26,11 @@ class AnkiThemeIntegration:
     def __init__(self):
         self.original_night_mode = None
         self._sync_enabled = True
+        self._pending_theme = None  # (theme_data, classified_type) awaiting the debounced sync
+        self._sync_timer = None  # Created on first sync request
+        self._last_theme_sig = None  # (name, type, background) of last applied theme
+        self._last_night_mode = None  # Night mode that theme was synced to
+        self._night_mode_setters = None  # Resolved by _get_night_mode_setters
         
     def is_sync_enabled(self) -> bool:
         """Check if automatic theme sync is enabled"""
@@ -26,7 +39,7 @@ class AnkiThemeIntegration:
     def set_sync_enabled(self, enabled: bool):
         """Enable or disable automatic theme synchronization"""
         self._sync_enabled = enabled
-        print(f"🔄 Anki theme sync {'enabled' if enabled else 'disabled'}")
+        logger.info("🔄 Anki theme sync %s", 'enabled' if enabled else 'disabled')
     
     def get_current_anki_night_mode(self) -> Optional[bool]:
         """
@@ -37,7 +50,7 @@ class AnkiThemeIntegration:
             if mw and hasattr(mw, 'pm') and mw.pm:
                 return mw.pm.night_mode()
         except Exception as e:
-            print(f"⚠️ Could not get Anki night mode status: {e}")
+            logger.warning("⚠️ Could not get Anki night mode status: %s", e)
         return None
     
     def classify_vscode_theme(self, theme_data: Dict[str, Any]) -> str:
@@ -50,20 +63,8 @@ class AnkiThemeIntegration:
         Returns:
             'light' or 'dark'
         """
-        # Primary: Use explicit type field
-        if 'type' in theme_data:
-            theme_type = str(theme_data['type']).lower()
-            if theme_type in ['light', 'dark']:
-                return theme_type
-        
-        # Secondary: Analyze background color brightness
-        colors = theme_data.get('colors', {})
-        bg_color = colors.get('editor.background', '#1e1e1e')
-        
-        if self._is_light_color(bg_color):
-            return 'light'
-        else:
-            return 'dark'
+        # Classification precomputed when the theme was downloaded
+        return get_stored_classification(theme_data) or classify_theme_data(theme_data)
     
     def _is_light_color(self, hex_color: str) -> bool:
         """
@@ -75,35 +76,7 @@ class AnkiThemeIntegration:
         Returns:
             True if light color, False if dark
         """
-        try:
-            # Remove # if present
-            hex_color = hex_color.lstrip('#')
-            
-            # Convert to RGB
-            if len(hex_color) == 3:
-                hex_color = ''.join([c*2 for c in hex_color])
-            
-            r = int(hex_color[0:2], 16) / 255.0
-            g = int(hex_color[2:4], 16) / 255.0  
-            b = int(hex_color[4:6], 16) / 255.0
-            
-            # Calculate relative luminance
-            def gamma_correct(c):
-                return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
-            
-            r_lin = gamma_correct(r)
-            g_lin = gamma_correct(g)
-            b_lin = gamma_correct(b)
-            
-            luminance = 0.2126 * r_lin + 0.7152 * g_lin + 0.0722 * b_lin
-            
-            # Threshold of 0.5 for light vs dark
-            return luminance > 0.5
-            
-        except Exception as e:
-            print(f"⚠️ Error analyzing color {hex_color}: {e}")
-            # Default to dark for unknown colors
-            return False
+        return is_light_color(hex_color)
     
     def should_sync_to_anki_theme(self, theme_type: str) -> Tuple[bool, str]:
         """
@@ -131,26 +104,78 @@ class AnkiThemeIntegration:
         
         return True, f"Need to switch Anki from {'dark' if current_is_dark else 'light'} to {theme_type}"
     
-    def sync_anki_theme(self, theme_data: Dict[str, Any]) -> bool:
+    def sync_anki_theme(self, theme_data: Dict[str, Any], classified_type: Optional[str] = None) -> None:
         """
-        Synchronize Anki's native theme with VS Code theme.
+        Schedule synchronization of Anki's native theme with VS Code theme.
+        
+        Calls within SYNC_DEBOUNCE_MS of each other are coalesced, so a burst
+        of theme switches only syncs (and repaints) for the last theme. The
+        outcome is not known until the debounced sync runs; failures are
+        logged there after falling back to the theme's declared type.
         
         Args:
             theme_data: VS Code theme JSON data
+            classified_type: 'light' or 'dark' if the caller already classified the theme
+        """
+        self._pending_theme = (theme_data, classified_type)
+        if self._sync_timer is None:
+            self._sync_timer = QTimer()
+            self._sync_timer.setSingleShot(True)
+            self._sync_timer.timeout.connect(self._flush_sync)
+        # Restarting the timer pushes the sync back until the burst is over
+        self._sync_timer.start(SYNC_DEBOUNCE_MS)
+    
+    def _flush_sync(self):
+        """Debounce timer fired: sync to the most recently requested theme"""
+        pending, self._pending_theme = self._pending_theme, None
+        if pending is None:
+            return
+        theme_data, classified_type = pending
+        if not self._sync_now(theme_data, classified_type):
+            # Fallback to the theme's declared type with the plain night mode setter
+            logger.warning("⚠️ Advanced sync failed, trying fallback method")
+            try:
+                is_dark = theme_data.get("type", "dark") == "dark"
+                if hasattr(anki_theme_manager, 'set_night_mode'):
+                    anki_theme_manager.set_night_mode(is_dark)
+                    logger.info("✅ Fallback Anki night mode: %s", is_dark)
+                else:
+                    logger.error("❌ Anki theme sync failed and no fallback night mode setter is available")
+            except Exception as e:
+                logger.error("❌ All Anki theme sync methods failed: %s", e)
+    
+    def _sync_now(self, theme_data: Dict[str, Any], classified_type: Optional[str] = None) -> bool:
+        """
+        Synchronize Anki's native theme with VS Code theme immediately.
+        
+        Args:
+            theme_data: VS Code theme JSON data
+            classified_type: 'light' or 'dark' if the caller already classified the theme
             
         Returns:
             True if sync was successful, False otherwise
         """
+        # Same theme as the last successful sync, and Anki is still in the mode
+        # it set (the user may have toggled night mode by hand since): nothing to do
+        theme_sig = (
+            theme_data.get('name'),
+            theme_data.get('type'),
+            theme_data.get('colors', {}).get('editor.background'),
+        )
+        if (theme_sig == self._last_theme_sig
+                and self.get_current_anki_night_mode() == self._last_night_mode):
+            return True
+        
         try:
-            # Step 1: Classify the VS Code theme
-            theme_type = self.classify_vscode_theme(theme_data)
+            # Step 1: Classify the VS Code theme (unless the caller already did)
+            theme_type = classified_type or self.classify_vscode_theme(theme_data)
             theme_name = theme_data.get('name', 'Unknown')
             
-            print(f"🎨 Synchronizing Anki theme for '{theme_name}' ({theme_type})")
+            logger.info("🎨 Synchronizing Anki theme for '%s' (%s)", theme_name, theme_type)
             
             # Step 2: Check if sync is needed
             should_sync, reason = self.should_sync_to_anki_theme(theme_type)
-            print(f"🔍 Sync analysis: {reason}")
+            logger.debug("🔍 Sync analysis: %s", reason)
             
             if not should_sync:
                 return True  # No sync needed, but not an error
@@ -158,23 +183,23 @@ class AnkiThemeIntegration:
             # Step 3: Store original state if first time
             if self.original_night_mode is None:
                 self.original_night_mode = self.get_current_anki_night_mode()
-                print(f"💾 Stored original Anki theme state: {'dark' if self.original_night_mode else 'light'}")
+                logger.info("💾 Stored original Anki theme state: %s", 'dark' if self.original_night_mode else 'light')
             
             # Step 4: Apply sync using multiple methods
             is_dark = theme_type == 'dark'
             success = self._apply_anki_theme_change(is_dark)
             
             if success:
-                print(f"✅ Successfully synced Anki to {theme_type} mode")
+                logger.info("✅ Successfully synced Anki to %s mode", theme_type)
+                self._last_theme_sig = theme_sig
+                self._last_night_mode = is_dark
                 return True
             else:
-                print(f"❌ Failed to sync Anki theme")
+                logger.error("❌ Failed to sync Anki theme")
                 return False
                 
         except Exception as e:
-            print(f"❌ Error in sync_anki_theme: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error syncing Anki theme: %s", e)
             return False
     
     def _apply_anki_theme_change(self, is_dark: bool) -> bool:
@@ -187,65 +212,76 @@ class AnkiThemeIntegration:
         Returns:
             True if any method succeeded
         """
-        methods_tried = []
         success = False
+        set_night_mode_fn, pm_set_night_mode_fn = self._get_night_mode_setters()
         
         # Method 1: Direct anki_theme_manager API (current approach)
-        try:
-            if hasattr(anki_theme_manager, 'set_night_mode'):
-                anki_theme_manager.set_night_mode(is_dark)
-                methods_tried.append("anki_theme_manager.set_night_mode")
+        if set_night_mode_fn:
+            try:
+                set_night_mode_fn(is_dark)
                 success = True
-                print(f"✅ Method 1 success: anki_theme_manager.set_night_mode({is_dark})")
-            else:
-                methods_tried.append("anki_theme_manager.set_night_mode (not available)")
-        except Exception as e:
-            print(f"⚠️ Method 1 failed: {e}")
-            methods_tried.append(f"anki_theme_manager.set_night_mode (error: {e})")
+                logger.info("✅ Method 1 success: anki_theme_manager.set_night_mode(%s)", is_dark)
+            except Exception as e:
+                logger.warning("⚠️ Method 1 failed: %s", e)
+        else:
+            logger.debug("🔍 Method 1 unavailable: anki_theme_manager.set_night_mode")
         
-        # Method 2: Profile manager manipulation
-        try:
-            if mw and hasattr(mw, 'pm') and mw.pm:
-                # This is more experimental - profile manager direct access
-                if hasattr(mw.pm, 'set_night_mode'):
-                    mw.pm.set_night_mode(is_dark)
-                    methods_tried.append("mw.pm.set_night_mode")
-                    success = True
-                    print(f"✅ Method 2 success: mw.pm.set_night_mode({is_dark})")
-                else:
-                    methods_tried.append("mw.pm.set_night_mode (not available)")
-        except Exception as e:
-            print(f"⚠️ Method 2 failed: {e}")
-            methods_tried.append(f"mw.pm.set_night_mode (error: {e})")
+        # Method 2: Profile manager manipulation (experimental), only as a
+        # fallback so Anki doesn't get two theme changes for one sync
+        if not success and pm_set_night_mode_fn:
+            try:
+                pm_set_night_mode_fn(is_dark)
+                success = True
+                logger.info("✅ Method 2 success: mw.pm.set_night_mode(%s)", is_dark)
+            except Exception as e:
+                logger.warning("⚠️ Method 2 failed: %s", e)
+        elif not success:
+            logger.debug("🔍 Method 2 unavailable: mw.pm.set_night_mode")
         
-        # Method 3: Configuration file manipulation (experimental)
-        try:
-            # This would require investigation of Anki's config structure
-            # Placeholder for future implementation
-            methods_tried.append("config manipulation (not implemented)")
-        except Exception as e:
-            methods_tried.append(f"config manipulation (error: {e})")
+        # Method 3: Configuration file manipulation would require investigation
+        # of Anki's config structure; not implemented
         
-        # Method 4: Force refresh approach
+        # Method 4: Force refresh approach, once for whichever method succeeded
         if success:
-            try:
-                # Try to force UI refresh to apply theme changes
-                if mw:
-                    app = QApplication.instance()
-                    if app:
-                        app.processEvents()
-                    
-                    # Force repaint
-                    mw.update()
-                    mw.repaint()
-                    
-                print("✅ Forced UI refresh after theme change")
-            except Exception as e:
-                print(f"⚠️ UI refresh failed: {e}")
+            self._force_ui_refresh()
         
-        print(f"🔍 Methods attempted: {', '.join(methods_tried)}")
         return success
     
+    def _force_ui_refresh(self):
+        """Force a UI refresh so Anki shows the changed theme"""
+        try:
+            # Try to force UI refresh to apply theme changes
+            if mw:
+                app = QApplication.instance()
+                if app:
+                    app.processEvents()
+                
+                # Force repaint
+                mw.update()
+                mw.repaint()
+                
+            logger.info("✅ Forced UI refresh after theme change")
+        except Exception as e:
+            logger.warning("⚠️ UI refresh failed: %s", e)
+    
+    def _get_night_mode_setters(self) -> Tuple[Optional[Callable[[bool], None]], Optional[Callable[[bool], None]]]:
+        """
+        Resolve Anki's night mode setters once and reuse them.
+        
+        Returns:
+            (anki_theme_manager.set_night_mode, mw.pm.set_night_mode), None where unavailable
+        """
+        if self._night_mode_setters is None:
+            pm = getattr(mw, 'pm', None) if mw else None
+            if not pm:
+                # Profile manager not ready yet; resolve again next time
+                return getattr(anki_theme_manager, 'set_night_mode', None), None
+            self._night_mode_setters = (
+                getattr(anki_theme_manager, 'set_night_mode', None),
+                getattr(pm, 'set_night_mode', None),
+            )
+        return self._night_mode_setters
+    
     def restore_original_theme(self) -> bool:
         """
         Restore Anki to its original theme state.
@@ -254,17 +290,18 @@ class AnkiThemeIntegration:
             True if restoration was successful
         """
         if self.original_night_mode is None:
-            print("ℹ️ No original theme state to restore")
+            logger.info("ℹ️ No original theme state to restore")
             return True
         
         try:
             success = self._apply_anki_theme_change(self.original_night_mode)
             if success:
-                print(f"✅ Restored original Anki theme: {'dark' if self.original_night_mode else 'light'}")
+                logger.info("✅ Restored original Anki theme: %s", 'dark' if self.original_night_mode else 'light')
                 self.original_night_mode = None
+                self._last_theme_sig = None
             return success
         except Exception as e:
-            print(f"❌ Failed to restore original theme: {e}")
+            logger.error("❌ Failed to restore original theme: %s", e)
             return False
     
     def get_theme_sync_status(self) -> Dict[str, Any]:
@@ -296,6 +333,27 @@ class ThemeClassificationService:
     Service for classifying and categorizing VS Code themes.
     """
     
+    # theme_id -> (theme_data, 'light'/'dark'); an entry is only reused while
+    # the same theme dict is loaded under that id
+    _classification_cache: Dict[str, Tuple[Dict[str, Any], str]] = {}
+    
+    @staticmethod
+    def invalidate_cache():
+        """Forget all cached theme classifications"""
+        ThemeClassificationService._classification_cache.clear()
+    
+    @staticmethod
+    def _classify_cached(theme_id: str, theme_data: Dict[str, Any]) -> str:
+        """Classify a theme, reusing the previous result for the same theme dict"""
+        cache = ThemeClassificationService._classification_cache
+        cached = cache.get(theme_id)
+        if cached is not None and cached[0] is theme_data:
+            return cached[1]
+        
+        theme_type = anki_theme_integration.classify_vscode_theme(theme_data)
+        cache[theme_id] = (theme_data, theme_type)
+        return theme_type
+    
     @staticmethod
     def get_theme_type_for_anki(theme_id: str, themes: Dict[str, Any]) -> str:
         """
@@ -312,8 +370,7 @@ class ThemeClassificationService:
         if not theme_data:
             return 'dark'  # Default fallback
         
-        integration = AnkiThemeIntegration()
-        return integration.classify_vscode_theme(theme_data)
+        return ThemeClassificationService._classify_cached(theme_id, theme_data)
     
     @staticmethod
     def classify_all_themes(themes: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
@@ -326,14 +383,13 @@ class ThemeClassificationService:
         Returns:
             Dictionary with 'light' and 'dark' keys containing theme lists
         """
-        integration = AnkiThemeIntegration()
         classified = {'light': [], 'dark': []}
         
         for theme_id, theme_data in themes.items():
             if not isinstance(theme_data, dict):
                 continue
                 
-            theme_type = integration.classify_vscode_theme(theme_data)
+            theme_type = ThemeClassificationService._classify_cached(theme_id, theme_data)
             theme_info = {
                 'id': theme_id,
                 'name': theme_data.get('name', theme_id),
@@ -4,28 +4,91 @@ Browser-based VSCode Themes Scraper
 Uses browser automation to extract themes from vscodethemes.com
 """
 
-import json
+import posixpath
 import re
-import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 import logging
 from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from theme_classification import embed_classification
+from theme_download_utils import (
+    THEME_HINT_RE, RequestLimiter, ThemeMetadataLog, clean_filename, json_dump_file, json_loads,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Parallel theme downloads, and the minimum spacing between request starts
+DOWNLOAD_WORKERS = 8
+REQUEST_INTERVAL = 0.25
+
+VSCODETHEMES_URL = "https://vscodethemes.com"
+
+# Page snapshot patterns, compiled once
+_HEADING2_RE = re.compile(r'"([^"]*)".*\[level=2\]')
+_PUBLISHER_RE = re.compile(r'"by ([^"]*)"')
+_THEME_URL_RE = re.compile(r'/url: (/e/[^/]+/[^\s]+)')
+_LINK_NAME_RE = re.compile(r'link "([^"]*)"')
+
+
 class BrowserThemeScraper:
-    def __init__(self, themes_dir="themes"):
+    def __init__(self, themes_dir="themes", force=False):
         self.themes_dir = Path(themes_dir)
         self.themes_dir.mkdir(exist_ok=True)
         self.downloaded_themes = set()
-        self.theme_metadata = []
+        # Metadata of saved themes, checkpointed as they are downloaded
+        self.metadata_log = ThemeMetadataLog(self.themes_dir)
+        # Resume from a previous run unless forced to download everything again
+        if not force:
+            self._load_previous_metadata()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
+        # Keep-alive pool sized for the download threads, retrying throttled/failed requests
+        adapter = HTTPAdapter(
+            pool_connections=DOWNLOAD_WORKERS,
+            pool_maxsize=DOWNLOAD_WORKERS,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Shared across download threads
+        self._save_lock = threading.Lock()
+        self._request_limiter = RequestLimiter(REQUEST_INTERVAL)
+        # Filenames already in themes_dir, scanned once instead of a stat() per candidate
+        self._existing_names = {p.name for p in self.themes_dir.iterdir()}
+    
+    def _load_previous_metadata(self):
+        """Load metadata from earlier (possibly interrupted) runs so their themes are skipped"""
+        for metadata in self.metadata_log.load():
+            theme_page = metadata.get('theme_page', '') if isinstance(metadata, dict) else ''
+            if theme_page.startswith(VSCODETHEMES_URL):
+                self.downloaded_themes.add(theme_page[len(VSCODETHEMES_URL):])
+        if self.downloaded_themes:
+            logger.info(f"Resuming: {len(self.downloaded_themes)} themes already downloaded")
+    
+    def _save_theme_file(self, filepath, theme_data):
+        """Write theme JSON to filepath, or a numbered variant if it exists; returns the path used"""
+        # Pick the name and create the file under the lock so parallel downloads never collide
+        with self._save_lock:
+            counter = 1
+            original_filepath = filepath
+            while filepath.name in self._existing_names:
+                name_part = original_filepath.stem
+                extension = original_filepath.suffix
+                filepath = self.themes_dir / f"{name_part}_{counter}{extension}"
+                counter += 1
+            
+            self._existing_names.add(filepath.name)
+            json_dump_file(theme_data, filepath)
+        return filepath
     
     def extract_themes_from_page_snapshot(self, snapshot_text):
         """Extract theme information from browser snapshot"""
@@ -42,21 +105,21 @@ class BrowserThemeScraper:
             # Look for theme package headers
             if 'heading' in line and 'level=2' in line:
                 # Extract theme package name
-                match = re.search(r'"([^"]*)".*\[level=2\]', line)
+                match = _HEADING2_RE.search(line)
                 if match:
                     current_theme_package = match.group(1)
             
             # Look for publisher info
             elif 'heading' in line and 'level=3' in line and 'by ' in line:
-                match = re.search(r'"by ([^"]*)"', line)
+                match = _PUBLISHER_RE.search(line)
                 if match:
                     current_publisher = match.group(1)
             
             # Look for individual theme links
             elif 'link' in line and '/e/' in line:
                 # Extract URL and theme name
-                url_match = re.search(r'/url: (/e/[^/]+/[^\s]+)', line)
-                name_match = re.search(r'link "([^"]*)"', line)
+                url_match = _THEME_URL_RE.search(line)
+                name_match = _LINK_NAME_RE.search(line)
                 
                 if url_match and name_match:
                     theme_url = url_match.group(1)
@@ -68,7 +131,7 @@ class BrowserThemeScraper:
                             'theme_name': theme_name,
                             'package_name': current_theme_package,
                             'publisher': current_publisher,
-                            'full_url': f"https://vscodethemes.com{theme_url}"
+                            'full_url': f"{VSCODETHEMES_URL}{theme_url}"
                         })
                         self.downloaded_themes.add(theme_url)
         
@@ -98,80 +161,89 @@ class BrowserThemeScraper:
     def extract_theme_from_vsix(self, vsix_url, theme_info):
         """Download and extract theme JSON from VSIX package"""
         try:
+            import io
             import zipfile
-            import tempfile
             
             logger.info(f"Downloading VSIX: {vsix_url}")
+            self._request_limiter.wait()
             response = self.session.get(vsix_url, timeout=60)
             response.raise_for_status()
             
-            # Save VSIX to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.vsix', delete=False) as temp_file:
-                temp_file.write(response.content)
-                temp_vsix_path = temp_file.name
-            
-            try:
-                # Extract VSIX (it's a ZIP file)
-                with zipfile.ZipFile(temp_vsix_path, 'r') as zip_ref:
-                    # Look for theme JSON files
-                    theme_files = []
-                    for file_path in zip_ref.namelist():
-                        if file_path.endswith('.json') and ('theme' in file_path.lower() or 'color' in file_path.lower()):
-                            theme_files.append(file_path)
-                    
-                    # Extract and save theme files
-                    saved_count = 0
-                    for theme_file_path in theme_files:
-                        try:
-                            theme_content = zip_ref.read(theme_file_path)
-                            theme_data = json.loads(theme_content)
-                            
-                            # Generate filename
-                            filename = self.generate_filename_from_vsix(theme_file_path, theme_data, theme_info)
-                            filepath = self.themes_dir / filename
-                            
-                            # Avoid duplicates
-                            counter = 1
-                            original_filepath = filepath
-                            while filepath.exists():
-                                name_part = original_filepath.stem
-                                extension = original_filepath.suffix
-                                filepath = self.themes_dir / f"{name_part}_{counter}{extension}"
-                                counter += 1
-                            
-                            # Save theme
-                            with open(filepath, 'w', encoding='utf-8') as f:
-                                json.dump(theme_data, f, indent=2)
-                            
-                            # Track metadata
-                            metadata = {
-                                'filename': filepath.name,
-                                'source_vsix': vsix_url,
-                                'theme_page': theme_info['full_url'],
-                                'package_name': theme_info.get('package_name', ''),
-                                'publisher': theme_info.get('publisher', ''),
-                                'display_name': theme_data.get('displayName', theme_info['theme_name']),
-                                'description': theme_data.get('description', ''),
-                                'type': theme_data.get('type', 'unknown')
-                            }
-                            self.theme_metadata.append(metadata)
-                            
-                            logger.info(f"Extracted theme: {filepath.name}")
-                            saved_count += 1
-                            
-                        except Exception as e:
-                            logger.debug(f"Error extracting {theme_file_path}: {e}")
-                    
-                    return saved_count > 0
-                    
-            finally:
-                # Clean up temp file
-                Path(temp_vsix_path).unlink(missing_ok=True)
+            # Extract VSIX (it's a ZIP file) straight from memory
+            with zipfile.ZipFile(io.BytesIO(response.content), 'r') as zip_ref:
+                # Look for theme JSON files
+                theme_files = self._find_theme_files(zip_ref)
+                
+                # Extract and save theme files
+                saved_count = 0
+                for theme_file_path in theme_files:
+                    try:
+                        theme_content = zip_ref.read(theme_file_path)
+                        theme_data = json_loads(theme_content)
+                        
+                        # Generate filename
+                        filename = self.generate_filename_from_vsix(theme_file_path, theme_data, theme_info)
+                        filepath = self.themes_dir / filename
+                        
+                        # Save theme with its light/dark type precomputed for Anki sync
+                        embed_classification(theme_data)
+                        filepath = self._save_theme_file(filepath, theme_data)
+                        
+                        # Track metadata
+                        metadata = {
+                            'filename': filepath.name,
+                            'source_vsix': vsix_url,
+                            'theme_page': theme_info['full_url'],
+                            'package_name': theme_info.get('package_name', ''),
+                            'publisher': theme_info.get('publisher', ''),
+                            'display_name': theme_data.get('displayName', theme_info['theme_name']),
+                            'description': theme_data.get('description', ''),
+                            'type': theme_data.get('type', 'unknown')
+                        }
+                        self.metadata_log.record(metadata)
+                        
+                        logger.info(f"Extracted theme: {filepath.name}")
+                        saved_count += 1
+                        
+                    except Exception as e:
+                        logger.debug(f"Error extracting {theme_file_path}: {e}")
+                
+                return saved_count > 0
                 
         except Exception as e:
             logger.error(f"Error extracting VSIX {vsix_url}: {e}")
             return False
     
+    def _find_theme_files(self, zip_ref):
+        """List theme JSON files in a VSIX, preferring those its manifest declares"""
+        names = zip_ref.namelist()
+        
+        # contributes.themes in extension/package.json is the authoritative list
+        try:
+            manifest = json_loads(zip_ref.read('extension/package.json'))
+            declared = manifest['contributes']['themes']
+        except (KeyError, TypeError, ValueError):
+            declared = None
+        
+        if isinstance(declared, list):
+            name_set = set(names)
+            theme_files = []
+            for entry in declared:
+                if not isinstance(entry, dict) or not isinstance(entry.get('path'), str):
+                    continue
+                file_path = posixpath.normpath(posixpath.join('extension', entry['path']))
+                if file_path.endswith('.json') and file_path in name_set and file_path not in theme_files:
+                    theme_files.append(file_path)
+            if theme_files:
+                return theme_files
+        
+        # Fallback: any JSON file whose path mentions a theme or colors
+        theme_files = []
+        for file_path in names:
+            if file_path.endswith('.json') and THEME_HINT_RE.search(file_path):
+                theme_files.append(file_path)
+        return theme_files
+    
     def generate_filename_from_vsix(self, file_path, theme_data, theme_info):
         """Generate filename from VSIX extraction"""
         # Try different name sources
@@ -192,9 +264,7 @@ class BrowserThemeScraper:
             name = "unknown_theme"
         
         # Clean filename
-        name = re.sub(r'[^\w\-_\.]', '_', name)
-        name = re.sub(r'_+', '_', name)
-        name = name.strip('_')
+        name = clean_filename(name)
         
         if not name.endswith('.json'):
             name += '.json'
@@ -211,27 +281,19 @@ class BrowserThemeScraper:
                 raw_url = github_url
             
             logger.info(f"Downloading from GitHub: {raw_url}")
+            self._request_limiter.wait()
             response = self.session.get(raw_url, timeout=30)
             response.raise_for_status()
             
-            theme_data = response.json()
+            theme_data = json_loads(response.content)
             
             # Generate filename
             filename = self.generate_filename_from_vsix(github_url, theme_data, theme_info)
             filepath = self.themes_dir / filename
             
-            # Avoid duplicates
-            counter = 1
-            original_filepath = filepath
-            while filepath.exists():
-                name_part = original_filepath.stem
-                extension = original_filepath.suffix
-                filepath = self.themes_dir / f"{name_part}_{counter}{extension}"
-                counter += 1
-            
-            # Save theme
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(theme_data, f, indent=2)
+            # Save theme with its light/dark type precomputed for Anki sync
+            embed_classification(theme_data)
+            filepath = self._save_theme_file(filepath, theme_data)
             
             # Track metadata
             metadata = {
@@ -244,7 +306,7 @@ class BrowserThemeScraper:
                 'description': theme_data.get('description', ''),
                 'type': theme_data.get('type', 'unknown')
             }
-            self.theme_metadata.append(metadata)
+            self.metadata_log.record(metadata)
             
             logger.info(f"Downloaded GitHub theme: {filepath.name}")
             return True
@@ -255,10 +317,8 @@ class BrowserThemeScraper:
     
     def save_metadata(self):
         """Save metadata about all downloaded themes"""
-        metadata_file = self.themes_dir / 'themes_metadata.json'
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.theme_metadata, f, indent=2)
-        logger.info(f"Metadata saved to: {metadata_file}")
+        self.metadata_log.save()
+        logger.info(f"Metadata saved to: {self.metadata_log.metadata_file}")
 
 # Global scraper instance for use with browser automation
 browser_scraper = BrowserThemeScraper()
@@ -270,35 +330,33 @@ def process_page_themes(snapshot_text, page_num):
     themes = browser_scraper.extract_themes_from_page_snapshot(snapshot_text)
     logger.info(f"Found {len(themes)} themes on page {page_num}")
     
-    successful_downloads = 0
-    
-    for i, theme_info in enumerate(themes, 1):
+    def download_one(numbered_theme):
+        i, theme_info = numbered_theme
         logger.info(f"Processing theme {i}/{len(themes)}: {theme_info['theme_name']}")
         
         # Try multiple download strategies
-        downloaded = False
         
         # Strategy 1: Try VS Code Marketplace
         marketplace_url = browser_scraper.get_vscode_marketplace_url(theme_info)
-        if marketplace_url and not downloaded:
+        if marketplace_url:
             try:
                 if browser_scraper.extract_theme_from_vsix(marketplace_url, theme_info):
-                    downloaded = True
-                    successful_downloads += 1
+                    return True
             except Exception as e:
                 logger.debug(f"Marketplace download failed: {e}")
         
         # Strategy 2: Try GitHub
-        if not downloaded:
-            try:
-                if browser_scraper.download_github_theme(theme_info['full_url'], theme_info):
-                    downloaded = True
-                    successful_downloads += 1
-            except Exception as e:
-                logger.debug(f"GitHub download failed: {e}")
+        try:
+            if browser_scraper.download_github_theme(theme_info['full_url'], theme_info):
+                return True
+        except Exception as e:
+            logger.debug(f"GitHub download failed: {e}")
         
-        # Add small delay between downloads
-        time.sleep(0.5)
+        return False
+    
+    # Downloads are network-bound; overlap them (request spacing is enforced by the scraper)
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        successful_downloads = sum(executor.map(download_one, enumerate(themes, 1)))
     
     logger.info(f"Page {page_num} completed: {successful_downloads}/{len(themes)} themes downloaded")
     return successful_downloads, len(themes)
@@ -306,7 +364,7 @@ def process_page_themes(snapshot_text, page_num):
 def finalize_scraping():
     """Finalize the scraping process"""
     browser_scraper.save_metadata()
-    total_themes = len(browser_scraper.theme_metadata)
+    total_themes = len(browser_scraper.metadata_log.entries)
     logger.info(f"Scraping completed! Total themes downloaded: {total_themes}")
     logger.info(f"Themes saved to: {browser_scraper.themes_dir}")
     return total_themes 
\ No newline at end of file
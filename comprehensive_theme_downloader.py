@@ -4,82 +4,120 @@ Comprehensive VSCode Theme Downloader
 Downloads themes from VS Code marketplace using minimal dependencies
 """
 
-import json
-import re
-import urllib.request
-import urllib.parse
-import urllib.error
+import io
+import sys
+import threading
 import zipfile
-import tempfile
-import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
 
+from theme_download_utils import THEME_HINT_RE, HttpClient, ThemeMetadataLog, clean_filename, json_loads, strip_bom
+
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Parallel VSIX downloads, and the minimum spacing between request starts
+DOWNLOAD_WORKERS = 8
+REQUEST_INTERVAL = 0.25
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+
+# Larger archive entries are bundled data (grammars, locales), not color themes
+MAX_THEME_FILE_SIZE = 2 * 1024 * 1024
+
+
 class VSCodeThemeDownloader:
-    def __init__(self, themes_dir="themes"):
+    def __init__(self, themes_dir="themes", force=False):
         self.themes_dir = Path(themes_dir)
         self.themes_dir.mkdir(exist_ok=True)
         self.downloaded_themes = set()
-        self.theme_metadata = []
+        # Metadata of saved themes, checkpointed as they are extracted
+        self.metadata_log = ThemeMetadataLog(self.themes_dir)
+        # Extensions that were downloaded but contained no theme files, one per line
+        self._no_themes_file = self.themes_dir / '.marketplace_no_themes'
+        # Resume from a previous run unless forced to download everything again
+        if force:
+            self._no_themes_file.unlink(missing_ok=True)
+        else:
+            self._load_previous_metadata()
+        # Guards picking a free filename + saving across download threads
+        self._save_lock = threading.Lock()
+        # Names already in themes_dir, so picking a free filename needs no stat calls
+        self._existing_names = {p.name for p in self.themes_dir.iterdir()}
+        # One keep-alive pool shared by all download threads, spacing out request
+        # starts and retrying throttled requests to stay polite to the marketplace
+        self._http = HttpClient(DOWNLOAD_WORKERS, REQUEST_INTERVAL, headers={'User-Agent': USER_AGENT})
         
+    def _load_previous_metadata(self):
+        """Load metadata from earlier (possibly interrupted) runs so their extensions are skipped"""
+        for metadata in self.metadata_log.load():
+            if isinstance(metadata, dict) and metadata.get('source_extension'):
+                self.downloaded_themes.add(metadata['source_extension'])
+        if self._no_themes_file.exists():
+            with open(self._no_themes_file, 'r', encoding='utf-8') as f:
+                self.downloaded_themes.update(line.strip() for line in f if line.strip())
+        if self.downloaded_themes:
+            logger.info(f"Resuming: {len(self.downloaded_themes)} extensions already downloaded")
+    
     def get_marketplace_extension_url(self, publisher, extension_name):
         """Get the VS Code marketplace download URL for an extension"""
         return f"https://marketplace.visualstudio.com/_apis/public/gallery/publishers/{publisher}/vsextensions/{extension_name}/latest/vspackage"
     
+    def fetch(self, url):
+        """Download url and return the response body"""
+        _, body, _ = self._http.get(url)
+        return body
+    
     def download_and_extract_vsix(self, vsix_url, extension_info):
         """Download VSIX and extract theme files"""
         try:
             logger.info(f"Downloading: {extension_info['name']} by {extension_info['publisher']}")
             
             # Download VSIX
-            req = urllib.request.Request(vsix_url)
-            req.add_header('User-Agent', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36')
+            vsix_data = self.fetch(vsix_url)
             
-            with urllib.request.urlopen(req, timeout=60) as response:
-                vsix_data = response.read()
-            
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(suffix='.vsix', delete=False) as temp_file:
-                temp_file.write(vsix_data)
-                temp_vsix_path = temp_file.name
-            
-            try:
-                # Extract VSIX (it's a ZIP)
-                with zipfile.ZipFile(temp_vsix_path, 'r') as zip_ref:
-                    extracted_count = 0
-                    
-                    # Look for theme files
-                    for file_path in zip_ref.namelist():
-                        if (file_path.endswith('.json') and 
-                            ('theme' in file_path.lower() or 
-                             'color' in file_path.lower() or
-                             file_path.endswith('-color-theme.json'))):
+            # Extract VSIX (it's a ZIP) straight from memory
+            with zipfile.ZipFile(io.BytesIO(vsix_data), 'r') as zip_ref:
+                extracted_count = 0
+                
+                # Look for theme files
+                # Sizes come from the central directory, so oversized entries are
+                # skipped without being inflated
+                for info in zip_ref.infolist():
+                    file_path = info.filename
+                    if (file_path.endswith('.json') and info.file_size <= MAX_THEME_FILE_SIZE
+                            and THEME_HINT_RE.search(file_path)):
+                        
+                        try:
+                            # Read theme content
+                            theme_content = zip_ref.read(file_path)
+                            # Drop a UTF-8 BOM: orjson rejects it, and the saved copy must
+                            # load with ThemeManager's plain utf-8 json.load
+                            theme_content = strip_bom(theme_content)
+                            theme_data = json_loads(theme_content)
                             
-                            try:
-                                # Read theme content
-                                theme_content = zip_ref.read(file_path)
-                                theme_data = json.loads(theme_content.decode('utf-8'))
-                                
-                                # Generate filename
-                                filename = self.generate_filename(file_path, theme_data, extension_info)
-                                filepath = self.themes_dir / filename
-                                
+                            # Generate filename
+                            filename = self.generate_filename(file_path, theme_data, extension_info)
+                            filepath = self.themes_dir / filename
+                            
+                            with self._save_lock:
                                 # Avoid duplicates
                                 counter = 1
                                 original_filepath = filepath
-                                while filepath.exists():
+                                while filepath.name in self._existing_names:
                                     name_part = original_filepath.stem
                                     extension = original_filepath.suffix
                                     filepath = self.themes_dir / f"{name_part}_{counter}{extension}"
                                     counter += 1
                                 
-                                # Save theme
-                                with open(filepath, 'w', encoding='utf-8') as f:
-                                    json.dump(theme_data, f, indent=2)
+                                self._existing_names.add(filepath.name)
+                                
+                                # Save theme as shipped; it already parsed as JSON, so
+                                # re-serializing it would only cost time
+                                with open(filepath, 'wb') as f:
+                                    f.write(theme_content)
                                 
                                 # Track metadata
                                 metadata = {
@@ -92,32 +130,46 @@ class VSCodeThemeDownloader:
                                     'type': theme_data.get('type', 'unknown'),
                                     'original_path': file_path
                                 }
-                                self.theme_metadata.append(metadata)
-                                
-                                logger.info(f"✓ Extracted: {filepath.name}")
-                                extracted_count += 1
-                                
-                            except Exception as e:
-                                logger.debug(f"Error processing {file_path}: {e}")
-                    
-                    if extracted_count > 0:
-                        logger.info(f"Successfully extracted {extracted_count} themes from {extension_info['name']}")
-                        return True
-                    else:
-                        logger.warning(f"No themes found in {extension_info['name']}")
-                        return False
-                        
-            finally:
-                # Clean up temp file
-                try:
-                    os.unlink(temp_vsix_path)
-                except:
-                    pass
+                                self.metadata_log.record(metadata)
+                            
+                            logger.info(f"✓ Extracted: {filepath.name}")
+                            extracted_count += 1
+                            
+                        except Exception as e:
+                            logger.debug(f"Error processing {file_path}: {e}")
+                
+                extension_id = f"{extension_info['publisher']}.{extension_info['name']}"
+                with self._save_lock:
+                    self.downloaded_themes.add(extension_id)
+                    if not extracted_count and not self._declares_themes(zip_ref):
+                        # Remember it, so later runs don't download it again for nothing.
+                        # Declared themes that failed to parse are retried instead.
+                        with open(self._no_themes_file, 'a', encoding='utf-8') as f:
+                            f.write(extension_id + '\n')
+                
+                if extracted_count > 0:
+                    logger.info(f"Successfully extracted {extracted_count} themes from {extension_info['name']}")
+                    return True
+                else:
+                    logger.warning(f"No themes found in {extension_info['name']}")
+                    return False
                     
         except Exception as e:
             logger.error(f"Error downloading {extension_info['name']}: {e}")
             return False
     
+    @staticmethod
+    def _declares_themes(zip_ref):
+        """Whether the VSIX manifest contributes color themes (assumed so if it can't be read)"""
+        try:
+            manifest = json_loads(zip_ref.read('extension/package.json'))
+        except (KeyError, ValueError):
+            return True
+        if not isinstance(manifest, dict):
+            return True
+        contributes = manifest.get('contributes')
+        return bool(isinstance(contributes, dict) and contributes.get('themes'))
+    
     def generate_filename(self, file_path, theme_data, extension_info):
         """Generate a clean filename"""
         # Try different name sources
@@ -138,9 +190,7 @@ class VSCodeThemeDownloader:
             name = "unknown_theme"
         
         # Clean filename
-        name = re.sub(r'[^\w\-_\.]', '_', name)
-        name = re.sub(r'_+', '_', name)
-        name = name.strip('_')
+        name = clean_filename(name)
         
         # Add publisher prefix if not already there
         if not name.startswith(extension_info['publisher']):
@@ -209,39 +259,44 @@ class VSCodeThemeDownloader:
             {'publisher': 'hoovercj', 'name': 'vscode-power-mode'},
         ]
         
-        successful = 0
-        total = len(popular_extensions)
+        # Drop repeated entries and extensions fetched by a previous run
+        unique_extensions = {(e['publisher'], e['name']): e for e in popular_extensions}.values()
+        pending_extensions = [e for e in unique_extensions
+                              if f"{e['publisher']}.{e['name']}" not in self.downloaded_themes]
+        skipped = len(unique_extensions) - len(pending_extensions)
+        if skipped:
+            logger.info(f"Skipping {skipped} already downloaded extensions")
         
-        for i, ext_info in enumerate(popular_extensions, 1):
+        total = len(pending_extensions)
+        
+        def download_one(indexed_ext):
+            i, ext_info = indexed_ext
             logger.info(f"Processing {i}/{total}: {ext_info['publisher']}.{ext_info['name']}")
-            
             marketplace_url = self.get_marketplace_extension_url(ext_info['publisher'], ext_info['name'])
-            
-            if self.download_and_extract_vsix(marketplace_url, ext_info):
-                successful += 1
-            
-            # Small delay to be respectful
-            import time
-            time.sleep(0.5)
+            return self.download_and_extract_vsix(marketplace_url, ext_info)
+        
+        # Downloads are I/O bound, so overlap them; the pool size caps the number
+        # of concurrent requests and fetch spaces out their starts
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            successful = sum(executor.map(download_one, enumerate(pending_extensions, 1)))
         
         self.save_metadata()
         
         logger.info(f"✅ Download completed!")
         logger.info(f"Successfully processed: {successful}/{total} extensions")
-        logger.info(f"Total themes downloaded: {len(self.theme_metadata)}")
+        logger.info(f"Total themes downloaded: {len(self.metadata_log.entries)}")
         logger.info(f"Themes saved to: {self.themes_dir}")
         
-        return successful, len(self.theme_metadata)
+        return successful, len(self.metadata_log.entries)
     
     def save_metadata(self):
         """Save metadata about downloaded themes"""
-        metadata_file = self.themes_dir / 'themes_metadata.json'
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.theme_metadata, f, indent=2)
-        logger.info(f"📝 Metadata saved to: {metadata_file}")
+        self.metadata_log.save()
+        logger.info(f"📝 Metadata saved to: {self.metadata_log.metadata_file}")
 
 def main():
-    downloader = VSCodeThemeDownloader()
+    # --force downloads every extension again instead of resuming
+    downloader = VSCodeThemeDownloader(force='--force' in sys.argv[1:])
     downloader.download_popular_themes()
 
 if __name__ == "__main__":
@@ -3,6 +3,8 @@ EMERGENCY DIAGNOSTIC AND FIX - Immediate theme consistency repair
 Run this in Anki debug console to diagnose and fix theme issues right now
 """
 
+import json
+
 # Required imports
 try:
     from aqt import mw
@@ -10,6 +12,28 @@ try:
 except ImportError:
     pass
 
+# Replaces the <style> element with the given id. The id and CSS go in as JSON
+# literals, so the script text stays the same apart from its arguments and the
+# CSS can't break out of it. The nuclear CSS selectors key on the body class it adds,
+# which leaves any id the page gives its body alone; elements marked
+# data-no-theme are excluded from them.
+_STYLE_INJECTION_JS = """
+(function(styleId, css) {{
+    var oldStyle = document.getElementById(styleId);
+    if (oldStyle) oldStyle.remove();
+    
+    document.body.classList.add('anki-body');
+    var style = document.createElement('style');
+    style.id = styleId;
+    style.textContent = css;
+    document.head.appendChild(style);
+}})({style_id}, {css});
+"""
+
+def inject_webview_style(style_id, css):
+    """Inject css into the main webview as <style id=style_id>"""
+    mw.web.eval(_STYLE_INJECTION_JS.format(style_id=json.dumps(style_id), css=json.dumps(css)))
+
 def emergency_diagnosis_and_fix():
     """
     Comprehensive emergency diagnosis and immediate fix application
@@ -81,17 +105,7 @@ def emergency_diagnosis_and_fix():
                 test_css = """
                 body { border: 2px solid red !important; }
                 """
-                mw.web.eval(f"""
-                    var testStyle = document.getElementById('emergency-test-css');
-                    if (testStyle) testStyle.remove();
-                    
-                    var style = document.createElement('style');
-                    style.id = 'emergency-test-css';
-                    style.textContent = `{test_css}`;
-                    document.head.appendChild(style);
-                    
-                    console.log('Emergency CSS test injected');
-                """)
+                inject_webview_style('emergency-test-css', test_css)
                 print("✅ Webview injection test completed")
                 
                 # Remove test CSS after 2 seconds
@@ -112,30 +126,34 @@ def emergency_diagnosis_and_fix():
             # Apply ultra-high specificity CSS directly
             emergency_nuclear_css = """
             /* EMERGENCY NUCLEAR CSS - MAXIMUM SPECIFICITY */
-            html body div#main html body .centralwidget html body * {
+            html body.anki-body *:not([data-no-theme]) {
                 background-color: #282c34 !important;
                 color: #abb2bf !important;
+                /* Cheaper restyles and paints on software-rendered webviews */
+                transition: none !important;
+                animation: none !important;
+                box-shadow: none !important;
             }
             
-            html body div#main html body .centralwidget html body QPushButton,
-            html body div#main html body .centralwidget html body .btn,
-            html body div#main html body .centralwidget html body button {
+            html body.anki-body QPushButton:not([data-no-theme]),
+            html body.anki-body .btn:not([data-no-theme]),
+            html body.anki-body button:not([data-no-theme]) {
                 background-color: #404754 !important;
                 color: #ffffff !important;
                 border: 1px solid #181a1f !important;
                 border-radius: 4px !important;
             }
             
-            html body div#main html body .centralwidget html body QPushButton:hover,
-            html body div#main html body .centralwidget html body .btn:hover,
-            html body div#main html body .centralwidget html body button:hover {
+            html body.anki-body QPushButton:not([data-no-theme]):hover,
+            html body.anki-body .btn:not([data-no-theme]):hover,
+            html body.anki-body button:not([data-no-theme]):hover {
                 background-color: #5a6375 !important;
             }
             
-            html body div#main html body .centralwidget html body QLineEdit,
-            html body div#main html body .centralwidget html body QTextEdit,
-            html body div#main html body .centralwidget html body input,
-            html body div#main html body .centralwidget html body textarea {
+            html body.anki-body QLineEdit:not([data-no-theme]),
+            html body.anki-body QTextEdit:not([data-no-theme]),
+            html body.anki-body input:not([data-no-theme]),
+            html body.anki-body textarea:not([data-no-theme]) {
                 background-color: #1e2227 !important;
                 color: #abb2bf !important;
                 border: 1px solid #181a1f !important;
@@ -144,39 +162,26 @@ def emergency_diagnosis_and_fix():
             
             # Method 1: Webview injection
             if mw and hasattr(mw, 'web'):
-                mw.web.eval(f"""
-                    var nuclearStyle = document.getElementById('emergency-nuclear-css');
-                    if (nuclearStyle) nuclearStyle.remove();
-                    
-                    var style = document.createElement('style');
-                    style.id = 'emergency-nuclear-css';
-                    style.textContent = `{emergency_nuclear_css}`;
-                    document.head.appendChild(style);
-                    
-                    console.log('Emergency nuclear CSS applied via webview');
-                """)
+                inject_webview_style('emergency-nuclear-css', emergency_nuclear_css)
                 print("✅ Nuclear CSS applied via webview")
             
-            # Method 2: Qt Application stylesheet
+            # Method 2: Qt Application stylesheet. It already applies to every
+            # widget, the main window included, so the same rules are not also
+            # set on mw: that would repeat the polish pass, and since a widget's
+            # own stylesheet overrides the application one, the mw copy would
+            # keep winning over later app-level theme changes.
             try:
                 from aqt.qt import QApplication
                 app = QApplication.instance()
                 if app:
                     current_style = app.styleSheet()
-                    app.setStyleSheet(current_style + "\n\n" + emergency_nuclear_css)
+                    # Don't stack another copy (and another restyle) on re-runs
+                    if emergency_nuclear_css not in current_style:
+                        app.setStyleSheet(current_style + "\n\n" + emergency_nuclear_css)
                     print("✅ Nuclear CSS applied via Qt stylesheet")
             except Exception as e:
                 print(f"⚠️ Qt stylesheet failed: {e}")
             
-            # Method 3: Main window direct
-            try:
-                if mw:
-                    current_style = mw.styleSheet()
-                    mw.setStyleSheet(current_style + "\n\n" + emergency_nuclear_css)
-                    print("✅ Nuclear CSS applied via main window")
-            except Exception as e:
-                print(f"⚠️ Main window styling failed: {e}")
-            
         except Exception as e:
             print(f"❌ Emergency nuclear CSS failed: {e}")
         
@@ -242,14 +247,18 @@ def apply_direct_nuclear_css():
         # Ultra-high specificity CSS that should beat everything
         nuclear_css = """
         /* DIRECT NUCLEAR CSS - BEATS ALL ADDON CONFLICTS */
-        html body div html body div html body div html body * {
+        html body.anki-body *:not([data-no-theme]) {
             background-color: #282c34 !important;
             color: #abb2bf !important;
+            /* Cheaper restyles and paints on software-rendered webviews */
+            transition: none !important;
+            animation: none !important;
+            box-shadow: none !important;
         }
         
-        html body div html body div html body div html body QPushButton,
-        html body div html body div html body div html body .btn,
-        html body div html body div html body div html body button {
+        html body.anki-body QPushButton:not([data-no-theme]),
+        html body.anki-body .btn:not([data-no-theme]),
+        html body.anki-body button:not([data-no-theme]) {
             background-color: #404754 !important;
             color: #ffffff !important;
             border: 1px solid #181a1f !important;
@@ -257,24 +266,16 @@ def apply_direct_nuclear_css():
             font-family: inherit !important;
         }
         
-        html body div html body div html body div html body QPushButton:hover,
-        html body div html body div html body div html body .btn:hover,
-        html body div html body div html body div html body button:hover {
+        html body.anki-body QPushButton:not([data-no-theme]):hover,
+        html body.anki-body .btn:not([data-no-theme]):hover,
+        html body.anki-body button:not([data-no-theme]):hover {
             background-color: #5a6375 !important;
         }
         """
         
         # Apply through all possible methods
         if mw and hasattr(mw, 'web'):
-            mw.web.eval(f"""
-                var directNuclear = document.getElementById('direct-nuclear-css');
-                if (directNuclear) directNuclear.remove();
-                
-                var style = document.createElement('style');
-                style.id = 'direct-nuclear-css';
-                style.textContent = `{nuclear_css}`;
-                document.head.appendChild(style);
-            """)
+            inject_webview_style('direct-nuclear-css', nuclear_css)
             print("✅ Direct nuclear CSS applied")
             return True
         else:
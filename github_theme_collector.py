@@ -6,18 +6,44 @@ Downloads themes from verified GitHub repositories containing VS Code theme JSON
 
 import json
 import os
-import urllib.request
-import urllib.parse
+import re
+import threading
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import time
 import sys
 
+from theme_download_utils import HttpClient, json_loads, strip_bom
+
+# Parallel theme downloads, and the minimum spacing between request starts
+DOWNLOAD_WORKERS = 8
+REQUEST_INTERVAL = 0.1
+
+# JSON recovery: a trailing comma before } or ], and a // comment on any line
+# that doesn't start with a string (so "http://..." values are left alone)
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+_LINE_COMMENT_RE = re.compile(r'^(?!\s*")([^\n]*?)//[^\n]*', re.MULTILINE)
+
+# Theme file name -> local file name: spaces (plain or %20) become '_';
+# parentheses (plain or %28/%29) and the '-color-theme' suffix are dropped
+_LOCAL_NAME_RE = re.compile(r'-color-theme|%2[089]|[ ()]')
+_LOCAL_NAME_REPLACEMENTS = {' ': '_', '%20': '_'}
+
+
 class GitHubThemeCollector:
     def __init__(self, themes_dir="themes"):
         self.themes_dir = Path(themes_dir)
         self.themes_dir.mkdir(exist_ok=True)
         self.downloaded_count = 0
+        self.unchanged_count = 0
         self.failed_count = 0
+        # Per-file {'url', 'etag'} from earlier runs, for conditional requests
+        self._etag_file = self.themes_dir / '.github_etags'
+        self._etags = self._load_etags()
+        # Shared across download threads; guards the counters and _etags
+        self._state_lock = threading.Lock()
+        # One keep-alive pool for raw.githubusercontent.com, spacing out request starts
+        self._http = HttpClient(DOWNLOAD_WORKERS, REQUEST_INTERVAL)
         
         # Updated theme sources with correct repository paths
         self.theme_sources = [
@@ -156,61 +182,112 @@ class GitHubThemeCollector:
                 ]
             }
         ]
+        
+        # (repo, file path, local name) per theme file, built once
+        self._jobs = [
+            (source['repo'], f"{source['path']}/{theme_file}", self._local_name(source['name'], theme_file))
+            for source in self.theme_sources
+            for theme_file in source['files']
+        ]
+    
+    @staticmethod
+    def _local_name(source_name, theme_file):
+        """Clean local filename for a theme file from the given source"""
+        clean_name = _LOCAL_NAME_RE.sub(lambda m: _LOCAL_NAME_REPLACEMENTS.get(m.group(), ''), theme_file)
+        return f"{source_name.lower().replace(' ', '_')}_{clean_name}"
+    
+    def _load_etags(self):
+        """Load the ETag cache written by a previous run"""
+        try:
+            with open(self._etag_file, 'r', encoding='utf-8') as f:
+                etags = json.load(f)
+            return etags if isinstance(etags, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_etags(self):
+        """Persist the ETag cache for the next run"""
+        with open(self._etag_file, 'w', encoding='utf-8') as f:
+            json.dump(self._etags, f, indent=2)
+    
+    def fetch(self, url, etag=None):
+        """
+        Download url and return (body text, ETag).
+        If etag is given and the file is unchanged (304), the body is None.
+        """
+        headers = {'If-None-Match': etag} if etag else None
+        status, body, response_headers = self._http.get(url, headers)
+        if status == 304:
+            return None, etag
+        return strip_bom(body).decode('utf-8'), response_headers.get('ETag')
+    
+    def _valid_theme_json(self, content):
+        """Return content if it is valid JSON, else a repaired copy (trailing commas or // comments)"""
+        # Most files are valid, so only the fast parser runs for them
+        try:
+            json_loads(content)
+            return content
+        except ValueError:
+            pass
+        
+        # Remove the common JSONC leftovers: // comments first, since one may
+        # follow a trailing comma, then trailing commas before } or ]
+        content = _LINE_COMMENT_RE.sub(r'\1', content)
+        content = _TRAILING_COMMA_RE.sub(r'\1', content)
+        # Raises if the repair didn't help
+        json.loads(content)
+        return content
     
     def download_theme(self, repo, file_path, local_name):
         """Download a single theme file from GitHub"""
         url = f"https://raw.githubusercontent.com/{repo}/main/{file_path}"
+        output_path = self.themes_dir / local_name
+        
+        # Revalidate against the last download, as long as we still have the file
+        cached = self._etags.get(local_name) if output_path.exists() else None
+        etag = None
+        if isinstance(cached, dict) and cached.get('url') and cached.get('etag'):
+            url, etag = cached['url'], cached['etag']
         
         try:
             print(f"Downloading: {local_name}...")
             
             # Try main branch first, then master if 404
             try:
-                with urllib.request.urlopen(url) as response:
-                    content = response.read().decode('utf-8')
+                content, new_etag = self.fetch(url, etag)
             except urllib.error.HTTPError as e:
                 if e.code == 404:
                     # Try master branch
                     url = f"https://raw.githubusercontent.com/{repo}/master/{file_path}"
-                    with urllib.request.urlopen(url) as response:
-                        content = response.read().decode('utf-8')
+                    content, new_etag = self.fetch(url)
                 else:
                     raise
             
+            if content is None:
+                print(f"✓ Unchanged: {local_name}")
+                with self._state_lock:
+                    self.unchanged_count += 1
+                return True
+            
             # Validate JSON and handle common issues
-            try:
-                theme_data = json.loads(content)
-            except json.JSONDecodeError as je:
-                # Try to fix common JSON issues
-                if "Illegal trailing comma" in str(je):
-                    # Remove trailing commas and retry
-                    import re
-                    content = re.sub(r',(\s*[}\]])', r'\1', content)
-                    theme_data = json.loads(content)
-                else:
-                    # Remove comments if present
-                    lines = content.split('\n')
-                    cleaned_lines = []
-                    for line in lines:
-                        # Remove single-line comments
-                        if '//' in line and not line.strip().startswith('"'):
-                            line = line.split('//')[0]
-                        cleaned_lines.append(line)
-                    content = '\n'.join(cleaned_lines)
-                    theme_data = json.loads(content)
+            content = self._valid_theme_json(content)
             
-            # Save to themes directory
-            output_path = self.themes_dir / local_name
+            # Save to themes directory. The text is already valid JSON, so it is
+            # written as is rather than parsed and re-serialized.
             with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(theme_data, f, indent=2, ensure_ascii=False)
+                f.write(content)
             
             print(f"✓ Saved: {local_name}")
-            self.downloaded_count += 1
+            with self._state_lock:
+                self.downloaded_count += 1
+                if new_etag:
+                    self._etags[local_name] = {'url': url, 'etag': new_etag}
             return True
             
         except Exception as e:
             print(f"✗ Failed to download {local_name}: {e}")
-            self.failed_count += 1
+            with self._state_lock:
+                self.failed_count += 1
             return False
     
     def collect_themes(self):
@@ -219,25 +296,17 @@ class GitHubThemeCollector:
         print(f"Output directory: {self.themes_dir.absolute()}")
         print("-" * 50)
         
-        for source in self.theme_sources:
-            print(f"\nProcessing: {source['name']}")
-            
-            for theme_file in source['files']:
-                file_path = f"{source['path']}/{theme_file}"
-                # Create clean filename
-                clean_name = theme_file.replace(' ', '_').replace('(', '').replace(')', '').replace('-color-theme', '').replace('%20', '_').replace('%28', '').replace('%29', '')
-                local_name = f"{source['name'].lower().replace(' ', '_')}_{clean_name}"
-                
-                self.download_theme(source['repo'], file_path, local_name)
-                
-                # Small delay to be respectful to GitHub
-                time.sleep(0.5)
-            
-            time.sleep(1)  # Longer delay between repositories
+        # Downloads are network-bound; overlap them (request starts are still
+        # spaced out by fetch to stay gentle on GitHub)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            list(executor.map(lambda job: self.download_theme(*job), self._jobs))
+        
+        self._save_etags()
         
         print("\n" + "=" * 50)
         print(f"Collection complete!")
         print(f"Successfully downloaded: {self.downloaded_count} themes")
+        print(f"Unchanged since last run: {self.unchanged_count} themes")
         print(f"Failed downloads: {self.failed_count} themes")
         print(f"Themes saved to: {self.themes_dir.absolute()}")
     
@@ -1,14 +1,33 @@
 # System Title Bar Theming - Customizes native macOS title bar colors
 
 import colorsys
+import functools
+import re
 from aqt.qt import *
 from aqt import mw
 from typing import Dict, Tuple, Optional
 import sys
 
+# Our QMainWindow rule inside mw's style sheet
+_QMAINWINDOW_RULE_RE = re.compile(r'QMainWindow\s*\{[^}]*\}')
+
+
+@functools.lru_cache(maxsize=64)
+def _window_style(color: str) -> str:
+    """QMainWindow style sheet rule for a title bar color"""
+    return f"""
+            QMainWindow {{
+                background-color: {color};
+            }}
+            """
+
+
 class SystemTitleBarThemer:
     """Customizes the native macOS system title bar to match VS Code theme colors"""
     
+    # (background color, is_dark) -> derived title bar color
+    _titlebar_color_cache: Dict[Tuple[str, bool], str] = {}
+    
     def __init__(self):
         self.current_theme_colors = {}
         self.original_window_color = None
@@ -32,7 +51,11 @@ class SystemTitleBarThemer:
             is_dark = self._is_dark_color(rgb)
             
             # Generate title bar color that complements the theme
-            titlebar_color = self._generate_titlebar_color(bg_color, accent_color, is_dark)
+            cache_key = (bg_color, is_dark)
+            titlebar_color = self._titlebar_color_cache.get(cache_key)
+            if titlebar_color is None:
+                titlebar_color = self._generate_titlebar_color(bg_color, accent_color, is_dark)
+                self._titlebar_color_cache[cache_key] = titlebar_color
             
             # Apply to main window
             self._apply_titlebar_styling(titlebar_color, is_dark)
@@ -92,26 +115,19 @@ class SystemTitleBarThemer:
             mw.setPalette(palette)
             
             # Method 2: Set stylesheet for window background
-            window_style = f"""
-            QMainWindow {{
-                background-color: {color};
-            }}
-            """
+            window_style = _window_style(color)
             
             # Apply without affecting existing styles
             current_style = mw.styleSheet()
             if "QMainWindow" in current_style:
                 # Replace existing QMainWindow style
-                import re
-                new_style = re.sub(
-                    r'QMainWindow\s*\{[^}]*\}', 
-                    window_style.strip(), 
-                    current_style
-                )
+                new_style = _QMAINWINDOW_RULE_RE.sub(window_style.strip(), current_style)
             else:
                 new_style = current_style + "\n" + window_style
             
-            mw.setStyleSheet(new_style)
+            # Qt re-parses the whole sheet on every set, so skip it when unchanged
+            if new_style != current_style:
+                mw.setStyleSheet(new_style)
             
             # Method 3: Try to set window appearance for macOS
             if hasattr(mw, 'winId'):
@@ -146,8 +162,7 @@ class SystemTitleBarThemer:
             # Remove custom window styling
             current_style = mw.styleSheet()
             if "QMainWindow" in current_style:
-                import re
-                new_style = re.sub(r'QMainWindow\s*\{[^}]*\}', '', current_style)
+                new_style = _QMAINWINDOW_RULE_RE.sub('', current_style)
                 mw.setStyleSheet(new_style)
             
             mw.update()
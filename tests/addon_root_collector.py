@@ -0,0 +1,17 @@
+"""
+pytest plugin (loaded from pytest.ini): collect the addon root as a plain directory.
+
+The root __init__.py is the Anki addon entry point and imports aqt, so pytest
+must not import it as a package just to collect the tests below it.
+"""
+
+from pathlib import Path
+
+import pytest
+
+_ADDON_ROOT = Path(__file__).resolve().parent.parent
+
+
+def pytest_collect_directory(path, parent):
+    if path == _ADDON_ROOT:
+        return pytest.Dir.from_parent(parent, path=path)
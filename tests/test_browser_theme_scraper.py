@@ -0,0 +1,78 @@
+"""Tests for the VSIX extraction path of browser_theme_scraper"""
+
+import importlib.util
+import io
+import json
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HAS_REQUESTS = importlib.util.find_spec('requests') is not None
+
+BOM_THEME = b'\xef\xbb\xbf' + json.dumps({
+    'name': 'BOM Theme',
+    'type': 'dark',
+    'colors': {'editor.background': '#1e1e1e'},
+}).encode('utf-8')
+
+
+def make_vsix(files):
+    """Build an in-memory VSIX (zip) from {archive path: bytes}"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_ref:
+        for name, data in files.items():
+            zip_ref.writestr(name, data)
+    return buffer.getvalue()
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, content):
+        self.content = content
+
+    def get(self, url, timeout=None):
+        return FakeResponse(self.content)
+
+
+@unittest.skipUnless(HAS_REQUESTS, "browser_theme_scraper needs requests")
+class ExtractThemeFromVsixTest(unittest.TestCase):
+    def setUp(self):
+        import browser_theme_scraper
+        self.module = browser_theme_scraper
+        self.themes_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.themes_dir.cleanup)
+        self.scraper = browser_theme_scraper.BrowserThemeScraper(self.themes_dir.name, force=True)
+
+    def test_json_loads_accepts_utf8_bom(self):
+        self.assertEqual(self.module.json_loads(BOM_THEME)['name'], 'BOM Theme')
+
+    def test_bom_prefixed_theme_is_extracted(self):
+        vsix = make_vsix({
+            'extension/package.json': json.dumps(
+                {'contributes': {'themes': [{'path': './themes/bom-color-theme.json'}]}}),
+            'extension/themes/bom-color-theme.json': BOM_THEME,
+        })
+        self.scraper.session = FakeSession(vsix)
+        theme_info = {'theme_name': 'BOM Theme', 'full_url': 'https://vscodethemes.com/e/pub.bom/bom'}
+
+        self.assertTrue(self.scraper.extract_theme_from_vsix('https://example.invalid/bom.vsix', theme_info))
+
+        saved = [p for p in Path(self.themes_dir.name).glob('*.json')]
+        self.assertEqual(len(saved), 1)
+        with open(saved[0], 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['name'], 'BOM Theme')
+
+
+if __name__ == '__main__':
+    unittest.main()
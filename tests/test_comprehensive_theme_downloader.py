@@ -0,0 +1,124 @@
+"""Tests for the VSIX extraction path of comprehensive_theme_downloader"""
+
+import io
+import json
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import comprehensive_theme_downloader
+import theme_download_utils
+
+BOM_THEME = b'\xef\xbb\xbf' + json.dumps({
+    'name': 'BOM Theme',
+    'type': 'dark',
+    'colors': {'editor.background': '#1e1e1e'},
+}).encode('utf-8')
+
+EXTENSION_INFO = {'publisher': 'pub', 'name': 'bom-theme'}
+
+
+def make_vsix(files):
+    """Build an in-memory VSIX (zip) from {archive path: bytes}"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_ref:
+        for name, data in files.items():
+            zip_ref.writestr(name, data)
+    return buffer.getvalue()
+
+
+class DownloadAndExtractVsixTest(unittest.TestCase):
+    def setUp(self):
+        self.themes_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.themes_dir.cleanup)
+        self.downloader = comprehensive_theme_downloader.VSCodeThemeDownloader(self.themes_dir.name)
+        vsix = make_vsix({'extension/themes/bom-color-theme.json': BOM_THEME})
+        self.downloader.fetch = lambda url: vsix
+
+    def assert_bom_theme_saved(self):
+        self.assertTrue(self.downloader.download_and_extract_vsix('https://example.invalid/bom.vsix', EXTENSION_INFO))
+
+        saved = list(Path(self.themes_dir.name).glob('*.json'))
+        self.assertEqual(len(saved), 1)
+        # Loaded the way ThemeManager.load_themes reads theme files
+        with open(saved[0], 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['name'], 'BOM Theme')
+
+    def test_bom_prefixed_theme_saved_without_bom(self):
+        self.assert_bom_theme_saved()
+
+    def test_bom_prefixed_theme_saved_without_bom_stdlib_json(self):
+        with mock.patch.object(theme_download_utils, 'orjson', None):
+            self.assert_bom_theme_saved()
+
+
+class DownloadPopularThemesTest(unittest.TestCase):
+    def setUp(self):
+        self.themes_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.themes_dir.cleanup)
+        self.fetched = []
+
+    def make_downloader(self, vsix):
+        downloader = comprehensive_theme_downloader.VSCodeThemeDownloader(self.themes_dir.name)
+
+        def fetch(url):
+            self.fetched.append(url)
+            return vsix
+        downloader.fetch = fetch
+        return downloader
+
+    def theme_files(self):
+        return [p for p in Path(self.themes_dir.name).glob('*.json') if p.name != 'themes_metadata.json']
+
+    def test_parallel_downloads_save_every_theme_once(self):
+        downloader = self.make_downloader(make_vsix({'extension/themes/bom-color-theme.json': BOM_THEME}))
+        successful, total_themes = downloader.download_popular_themes()
+
+        # Extensions sharing a publisher get numbered names instead of overwriting each other
+        self.assertEqual(len(self.theme_files()), successful)
+        self.assertEqual(total_themes, successful)
+        self.assertEqual(len(self.fetched), len(set(self.fetched)))
+
+    def test_rerun_skips_downloaded_extensions(self):
+        self.make_downloader(make_vsix({'extension/themes/bom-color-theme.json': BOM_THEME})).download_popular_themes()
+        first_run = len(self.fetched)
+
+        self.make_downloader(make_vsix({})).download_popular_themes()
+        self.assertEqual(len(self.fetched), first_run)
+
+    def test_rerun_skips_extensions_without_themes(self):
+        self.make_downloader(make_vsix({'extension/package.json': b'{}'})).download_popular_themes()
+        first_run = len(self.fetched)
+        self.assertEqual(self.theme_files(), [])
+
+        self.make_downloader(make_vsix({})).download_popular_themes()
+        self.assertEqual(len(self.fetched), first_run)
+
+    def test_rerun_retries_declared_themes_that_failed(self):
+        self.make_downloader(make_vsix({
+            'extension/package.json': json.dumps(
+                {'contributes': {'themes': [{'path': './themes/broken-color-theme.json'}]}}),
+            'extension/themes/broken-color-theme.json': b'{"name": ',
+        })).download_popular_themes()
+        first_run = len(self.fetched)
+
+        self.make_downloader(make_vsix({})).download_popular_themes()
+        self.assertEqual(len(self.fetched), 2 * first_run)
+
+    def test_force_clears_extensions_without_themes(self):
+        self.make_downloader(make_vsix({'extension/package.json': b'{}'})).download_popular_themes()
+        first_run = len(self.fetched)
+
+        forced = comprehensive_theme_downloader.VSCodeThemeDownloader(self.themes_dir.name, force=True)
+        self.assertEqual(forced.downloaded_themes, set())
+        self.make_downloader(make_vsix({})).download_popular_themes()
+        self.assertEqual(len(self.fetched), 2 * first_run)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Tests for the download and validation paths of github_theme_collector"""
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import github_theme_collector
+import theme_download_utils
+
+THEME_JSON = json.dumps({'name': 'Theme', 'colors': {'editor.background': '#1e1e1e'}})
+
+
+class ValidThemeJsonTest(unittest.TestCase):
+    def setUp(self):
+        self.themes_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.themes_dir.cleanup)
+        self.collector = github_theme_collector.GitHubThemeCollector(self.themes_dir.name)
+
+    def assert_repairs(self):
+        valid = self.collector._valid_theme_json
+        self.assertIs(valid(THEME_JSON), THEME_JSON)
+        self.assertEqual(json.loads(valid('{"colors": {"a": "#fff",}, "b": [1, 2,],}')),
+                         {'colors': {'a': '#fff'}, 'b': [1, 2]})
+        repaired = valid('{\n  // Editor\n  "url": "http://example.com",\n  // trailing\n}')
+        self.assertEqual(json.loads(repaired), {'url': 'http://example.com'})
+        with self.assertRaises(json.JSONDecodeError):
+            valid('{"unterminated": ')
+
+    def test_repairs(self):
+        self.assert_repairs()
+
+    def test_repairs_stdlib_json(self):
+        with mock.patch.object(theme_download_utils, 'orjson', None):
+            self.assert_repairs()
+
+
+class DownloadThemeTest(unittest.TestCase):
+    def setUp(self):
+        self.themes_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.themes_dir.cleanup)
+        self.collector = github_theme_collector.GitHubThemeCollector(self.themes_dir.name)
+        self.requests = []
+
+    def fake_fetch(self, url, etag=None):
+        """Serve THEME_JSON with ETag "v1", answering 304 to a matching If-None-Match"""
+        self.requests.append((url, etag))
+        if etag == '"v1"':
+            return None, etag
+        return THEME_JSON, '"v1"'
+
+    def test_unchanged_file_is_not_rewritten(self):
+        self.collector.fetch = self.fake_fetch
+        self.assertTrue(self.collector.download_theme('owner/repo', 'themes/t.json', 't.json'))
+        self.collector._save_etags()
+
+        output_path = Path(self.themes_dir.name) / 't.json'
+        output_path.write_text('local copy', encoding='utf-8')
+
+        # A later run revalidates with the stored ETag and keeps the file
+        rerun = github_theme_collector.GitHubThemeCollector(self.themes_dir.name)
+        rerun.fetch = self.fake_fetch
+        self.assertTrue(rerun.download_theme('owner/repo', 'themes/t.json', 't.json'))
+
+        self.assertEqual(self.requests[-1], ('https://raw.githubusercontent.com/owner/repo/main/themes/t.json', '"v1"'))
+        self.assertEqual((rerun.unchanged_count, rerun.downloaded_count), (1, 0))
+        self.assertEqual(output_path.read_text(encoding='utf-8'), 'local copy')
+
+    def test_missing_file_is_downloaded_again(self):
+        self.collector.fetch = self.fake_fetch
+        self.collector.download_theme('owner/repo', 'themes/t.json', 't.json')
+        (Path(self.themes_dir.name) / 't.json').unlink()
+
+        self.assertTrue(self.collector.download_theme('owner/repo', 'themes/t.json', 't.json'))
+        self.assertEqual(self.requests[-1][1], None)
+        self.assertEqual(self.collector.downloaded_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
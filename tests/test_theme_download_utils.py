@@ -0,0 +1,143 @@
+"""Tests for the helpers shared by the theme downloader scripts"""
+
+import http.server
+import json
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import theme_download_utils
+
+BOM_THEME = b'\xef\xbb\xbf' + json.dumps({'name': 'BOM Theme'}).encode('utf-8')
+
+
+class JsonLoadsTest(unittest.TestCase):
+    def assert_bom_ignored(self):
+        self.assertEqual(theme_download_utils.json_loads(BOM_THEME)['name'], 'BOM Theme')
+        self.assertEqual(theme_download_utils.json_loads(BOM_THEME.decode('utf-8'))['name'], 'BOM Theme')
+
+    def test_utf8_bom_is_ignored(self):
+        self.assert_bom_ignored()
+
+    def test_utf8_bom_is_ignored_stdlib_json(self):
+        with mock.patch.object(theme_download_utils, 'orjson', None):
+            self.assert_bom_ignored()
+
+
+class ThemeMetadataLogTest(unittest.TestCase):
+    def setUp(self):
+        self.themes_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.themes_dir.cleanup)
+        self.path = Path(self.themes_dir.name)
+
+    def test_checkpointed_entries_are_resumed(self):
+        log = theme_download_utils.ThemeMetadataLog(self.path)
+        log.record({'filename': 'a.json'})
+        log.record({'filename': 'b.json'})
+
+        # A run killed before save_metadata leaves only the JSONL log
+        self.assertFalse(log.metadata_file.exists())
+        resumed = theme_download_utils.ThemeMetadataLog(self.path).load()
+        self.assertEqual([e['filename'] for e in resumed], ['a.json', 'b.json'])
+
+    def test_partial_last_line_is_skipped(self):
+        log = theme_download_utils.ThemeMetadataLog(self.path)
+        log.record({'filename': 'a.json'})
+        with open(log.log_file, 'a', encoding='utf-8') as f:
+            f.write('{"filename": "b.js')
+
+        resumed = theme_download_utils.ThemeMetadataLog(self.path).load()
+        self.assertEqual(resumed, [{'filename': 'a.json'}])
+
+    def test_save_folds_log_into_metadata_file(self):
+        log = theme_download_utils.ThemeMetadataLog(self.path)
+        log.record({'filename': 'a.json'})
+        log.save()
+
+        self.assertFalse(log.log_file.exists())
+        with open(log.metadata_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [{'filename': 'a.json'}])
+
+        # Checkpoints after a save are resumed on top of the saved file
+        resumed = theme_download_utils.ThemeMetadataLog(self.path)
+        resumed.load()
+        resumed.record({'filename': 'b.json'})
+        reloaded = theme_download_utils.ThemeMetadataLog(self.path).load()
+        self.assertEqual([e['filename'] for e in reloaded], ['a.json', 'b.json'])
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serves '{}' with ETag "v1", after failing the first `failures` requests with 503"""
+    failures = 0
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        if type(self).requests <= type(self).failures:
+            self.send_response(503)
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTest(unittest.TestCase):
+    def setUp(self):
+        _Handler.failures = 0
+        _Handler.requests = 0
+        server = http.server.HTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f'http://127.0.0.1:{server.server_port}/theme.json'
+        # No real waiting between retries
+        patcher = mock.patch.object(theme_download_utils, 'RETRY_BACKOFF', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def clients(self):
+        client = theme_download_utils.HttpClient(2)
+        yield client
+        if client._pool:
+            client = theme_download_utils.HttpClient(2)
+            client._pool = None
+            yield client
+
+    def test_not_modified_returns_no_body(self):
+        for client in self.clients():
+            status, body, headers = client.get(self.url)
+            self.assertEqual((status, body, headers.get('ETag')), (200, b'{}', '"v1"'))
+            status, body, _ = client.get(self.url, {'If-None-Match': '"v1"'})
+            self.assertEqual((status, body), (304, None))
+
+    def test_server_errors_are_retried(self):
+        for client in self.clients():
+            _Handler.requests = 0
+            _Handler.failures = 2
+            self.assertEqual(client.get(self.url)[:2], (200, b'{}'))
+            self.assertEqual(_Handler.requests, 3)
+
+    def test_retries_are_bounded(self):
+        _Handler.failures = 100
+        client = theme_download_utils.HttpClient(2, retries=1)
+        with self.assertRaises(theme_download_utils.urllib.error.HTTPError) as cm:
+            client.get(self.url)
+        self.assertEqual(cm.exception.code, 503)
+        self.assertEqual(_Handler.requests, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# Theme Classification - Light/dark classification of VS Code themes
+# Pure Python (no aqt) so the theme downloaders can classify themes at save time
+
+import logging
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Key under which the light/dark classification is stored in saved theme JSON,
+# and the version of the classification logic that produced it. Bump the
+# version whenever classify_theme_data changes so stored results are redone.
+CLASSIFICATION_KEY = '_anki_classification'
+CLASSIFICATION_VERSION_KEY = '_anki_classification_version'
+CLASSIFICATION_VERSION = 1
+
+
+def _gamma_correct(c: float) -> float:
+    """Convert an sRGB channel (0-1) to linear light"""
+    return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+
+
+# Channel value (0-255) -> weighted contribution to relative luminance
+_SRGB_LIN = [_gamma_correct(v / 255.0) for v in range(256)]
+_LUM_R = [0.2126 * c for c in _SRGB_LIN]
+_LUM_G = [0.7152 * c for c in _SRGB_LIN]
+_LUM_B = [0.0722 * c for c in _SRGB_LIN]
+
+
+def is_light_color(hex_color: str) -> bool:
+    """
+    Determine if a hex color is light or dark based on luminance.
+
+    Args:
+        hex_color: Color in hex format (e.g., '#ffffff')
+
+    Returns:
+        True if light color, False if dark
+    """
+    try:
+        # Remove # if present
+        hex_digits = hex_color.lstrip('#')
+
+        # Convert to RGB
+        if len(hex_digits) == 3:
+            hex_digits = hex_digits[0] * 2 + hex_digits[1] * 2 + hex_digits[2] * 2
+
+        # Ignores any alpha channel (#rrggbbaa). Well-formed colors decode in
+        # one call; odd-length ones (#rrggb) are parsed per channel as before
+        try:
+            r, g, b = bytes.fromhex(hex_digits[:6])
+        except ValueError:
+            r = int(hex_digits[0:2], 16)
+            g = int(hex_digits[2:4], 16)
+            b = int(hex_digits[4:6], 16)
+
+        # Calculate relative luminance from the precomputed channel tables
+        luminance = _LUM_R[r] + _LUM_G[g] + _LUM_B[b]
+
+        # Threshold of 0.5 for light vs dark
+        return luminance > 0.5
+
+    except Exception as e:
+        logger.warning("⚠️ Error analyzing color %s: %s", hex_color, e)
+        # Default to dark for unknown colors
+        return False
+
+
+def classify_theme_data(theme_data: Dict[str, Any]) -> str:
+    """
+    Classify VS Code theme as 'light' or 'dark' from its JSON data.
+
+    Args:
+        theme_data: VS Code theme JSON data
+
+    Returns:
+        'light' or 'dark'
+    """
+    # Primary: Use explicit type field
+    if 'type' in theme_data:
+        theme_type = str(theme_data['type']).lower()
+        if theme_type in ['light', 'dark']:
+            return theme_type
+
+    # Secondary: Analyze background color brightness
+    colors = theme_data.get('colors', {})
+    bg_color = colors.get('editor.background', '#1e1e1e')
+
+    if is_light_color(bg_color):
+        return 'light'
+    else:
+        return 'dark'
+
+
+def get_stored_classification(theme_data: Dict[str, Any]) -> str:
+    """Return the classification saved in theme_data, or '' if missing or stale"""
+    if theme_data.get(CLASSIFICATION_VERSION_KEY) != CLASSIFICATION_VERSION:
+        return ''
+    theme_type = theme_data.get(CLASSIFICATION_KEY)
+    return theme_type if theme_type in ('light', 'dark') else ''
+
+
+def embed_classification(theme_data: Dict[str, Any]) -> str:
+    """Classify theme_data and store the result in it before it is saved"""
+    theme_type = classify_theme_data(theme_data)
+    theme_data[CLASSIFICATION_KEY] = theme_type
+    theme_data[CLASSIFICATION_VERSION_KEY] = CLASSIFICATION_VERSION
+    return theme_type
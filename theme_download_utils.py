@@ -0,0 +1,203 @@
+# Theme Download Utilities - Helpers shared by the theme downloader scripts
+# Pure Python (no aqt); orjson and urllib3 are used when installed
+
+import json
+import logging
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+# Optional fast JSON backend; falls back to the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional connection pooling; falls back to a fresh urllib connection per request
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
+logger = logging.getLogger(__name__)
+
+# Throttled or transiently failing responses worth retrying, and the backoff
+# before the first retry (doubled for each further attempt)
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+RETRY_BACKOFF = 0.5
+
+# Some theme files ship with one; orjson and ThemeManager's plain utf-8 reads reject it
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# Runs of characters unsafe in filenames (and of underscores) collapse to one '_'
+FILENAME_UNSAFE_RE = re.compile(r'(?:[^\w\-.]|_)+')
+
+# Archive paths that look like theme files (checked on .json paths only)
+THEME_HINT_RE = re.compile(r'theme|color', re.IGNORECASE)
+
+
+def strip_bom(data: bytes) -> bytes:
+    """Return data without a leading UTF-8 BOM"""
+    if data.startswith(UTF8_BOM):
+        return data[len(UTF8_BOM):]
+    return data
+
+
+def clean_filename(name: str) -> str:
+    """Replace filename-unsafe characters with '_' and trim leading/trailing '_'"""
+    return FILENAME_UNSAFE_RE.sub('_', name).strip('_')
+
+
+def json_loads(data):
+    """Parse JSON from bytes or str (a leading UTF-8 BOM is ignored), using orjson when available"""
+    if isinstance(data, bytes):
+        data = strip_bom(data)
+    elif data.startswith('\ufeff'):
+        data = data[1:]
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps_line(obj) -> str:
+    """Serialize obj as a single JSON line (with trailing newline)"""
+    if orjson:
+        return orjson.dumps(obj).decode('utf-8') + '\n'
+    return json.dumps(obj) + '\n'
+
+
+def json_dump_file(obj, filepath):
+    """Write obj as indented JSON to filepath, using orjson when available"""
+    if orjson:
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=2)
+
+
+class ThemeMetadataLog:
+    """
+    Metadata of downloaded themes, saved to themes_metadata.json. Entries added
+    since the last save are checkpointed to an append-only themes_metadata.jsonl
+    so an interrupted run can be resumed.
+    """
+
+    def __init__(self, themes_dir: Path):
+        self.metadata_file = themes_dir / 'themes_metadata.json'
+        self.log_file = themes_dir / 'themes_metadata.jsonl'
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load entries saved or checkpointed by earlier (possibly interrupted) runs"""
+        if self.metadata_file.exists():
+            try:
+                with open(self.metadata_file, 'rb') as f:
+                    metadata_list = json_loads(f.read())
+                if not isinstance(metadata_list, list):
+                    raise ValueError("expected a list of theme entries")
+                self.entries.extend(metadata_list)
+            except Exception as e:
+                logger.warning(f"Could not load previous metadata, starting fresh: {e}")
+
+        # Entries checkpointed since the last save (e.g. a killed run)
+        if self.log_file.exists():
+            with open(self.log_file, 'rb') as f:
+                for line in f:
+                    try:
+                        self.entries.append(json_loads(line))
+                    except ValueError:
+                        # Partially written last line of an interrupted run
+                        continue
+        return self.entries
+
+    def record(self, metadata):
+        """Add metadata for a saved theme and checkpoint it to the JSONL log"""
+        line = json_dumps_line(metadata)
+        with self._lock:
+            self.entries.append(metadata)
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def save(self):
+        """Write all entries to themes_metadata.json and drop the checkpoint log"""
+        with self._lock:
+            json_dump_file(self.entries, self.metadata_file)
+            # Everything in the checkpoint log is now in the JSON file
+            self.log_file.unlink(missing_ok=True)
+
+
+class RequestLimiter:
+    """Spaces request starts at least interval seconds apart across all threads"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_request_time = 0.0
+
+    def wait(self):
+        """Block until the calling thread may start its request"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HttpClient:
+    """
+    GET requests through one keep-alive urllib3 pool shared by all download
+    threads, or a fresh urllib connection per request without urllib3.
+    Request starts are spaced out by a RequestLimiter, and throttled or
+    failed (429/5xx) requests are retried a bounded number of times.
+    """
+
+    def __init__(self, pool_size: int, interval: float = 0.0, headers=None, retries: int = 3):
+        self.headers = dict(headers or {})
+        self.retries = retries
+        self._limiter = RequestLimiter(interval)
+        self._pool = urllib3.PoolManager(maxsize=pool_size) if urllib3 else None
+
+    def get(self, url, headers=None, timeout=60.0):
+        """
+        Return (status, body, response headers) for url.
+        A 304 Not Modified has a None body; other error statuses raise HTTPError.
+        """
+        request_headers = {**self.headers, **(headers or {})}
+        for attempt in range(self.retries + 1):
+            try:
+                return self._request(url, request_headers, timeout)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUSES or attempt == self.retries:
+                    raise
+                delay = RETRY_BACKOFF * 2 ** attempt
+                retry_after = e.headers.get('Retry-After', '') if e.headers else ''
+                if retry_after.isdigit():
+                    delay = max(delay, min(int(retry_after), 30))
+                logger.debug(f"HTTP {e.code} for {url}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _request(self, url, headers, timeout):
+        """Make a single GET request (see get)"""
+        self._limiter.wait()
+        if self._pool:
+            response = self._pool.request('GET', url, headers=headers, timeout=timeout)
+            if response.status == 304:
+                return 304, None, response.headers
+            if response.status >= 400:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+            return response.status, response.data, response.headers
+
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers),
+                                        timeout=timeout) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, None, e.headers
+            raise
@@ -5,7 +5,7 @@ import os
 from typing import Dict, Any, Optional
 from aqt import mw
 from aqt.theme import theme_manager as anki_theme_manager
-from aqt.qt import QApplication, QWidget, Qt, QVBoxLayout, QHBoxLayout, QGridLayout, QLayoutItem, QTimer
+from aqt.qt import QApplication
 
 # Import our new Anki theme integration service
 try:
@@ -29,12 +29,11 @@ except ImportError as e:
 
 # Import addon conflict manager
 try:
-    from .addon_conflict_manager import get_conflict_manager, resolve_all_conflicts
+    from .addon_conflict_manager import get_conflict_manager
     CONFLICT_MANAGER_AVAILABLE = True
     print("✅ Addon conflict manager loaded")
 except ImportError as e:
     get_conflict_manager = None
-    resolve_all_conflicts = None
     CONFLICT_MANAGER_AVAILABLE = False
     print(f"⚠️ Addon conflict manager not available: {e}")
 
@@ -59,9 +58,17 @@ class ThemeManager:
         self._css_cache = {}  # Cache per theme_id
         self._qt_stylesheet_cache = {}  # Cache per theme_id  
         self._reviewer_css_cache = {}  # Cache per theme_id
+        self._style_html_cache = {}  # <style>-wrapped CSS per theme_id and style id
+        self._css_getters = {
+            "main": self.get_current_theme_css,
+            "reviewer": self.get_reviewer_safe_css,
+        }
         self._current_theme_id = None
         self._cache_version = 1  # Increment to invalidate all caches
         
+        # Config values read on every webview load, refreshed on save
+        self._refresh_config_cache()
+        
         # Theme validator is optional - if it fails to load, we'll use basic validation
         self.validator = None
         
@@ -235,6 +242,7 @@ class ThemeManager:
     def save_config(self):
         """Save current configuration to Anki's addon manager"""
         try:
+            self._refresh_config_cache()
             if mw and self.addon_module_name:
                 mw.addonManager.writeConfig(self.addon_module_name, self.config)
                 print("✅ Configuration saved")
@@ -243,6 +251,11 @@ class ThemeManager:
         except Exception as e:
             print(f"❌ Error saving config: {e}")
 
+    def _refresh_config_cache(self):
+        """Snapshot config values used in the webview injection hot path"""
+        custom_css = self.config.get("custom_css", "")
+        self._custom_style_html = f'<style id="vscode-theme-custom-css">{custom_css}</style>' if custom_css else ""
+
     def get_current_theme_css(self) -> str:
         """Get CSS for current theme with caching for performance"""
         current_theme_id = self.config.get("current_theme", "one_dark_pro")
@@ -262,6 +275,17 @@ class ThemeManager:
         
         return css
     
+    def get_theme_style_html(self, style_id: str, css_type: str = "main") -> str:
+        """Get current theme CSS wrapped in a <style> element, cached for webview injection"""
+        current_theme_id = self.config.get("current_theme", "one_dark_pro")
+        cache_key = self._get_cache_key(current_theme_id, f"{css_type}_{style_id}")
+        style_html = self._style_html_cache.get(cache_key)
+        if style_html is None:
+            css = self._css_getters[css_type]()
+            style_html = f'<style id="{style_id}">{css}</style>' if css else ""
+            self._style_html_cache[cache_key] = style_html
+        return style_html
+    
     def _generate_theme_css(self, theme_id: str, context_type: str = "general") -> str:
         """Generate unified, consistent CSS for specific theme and context"""
         theme = self.themes.get(theme_id)
@@ -423,17 +447,17 @@ class ThemeManager:
                         auto_sync_enabled = self.config.get("auto_sync_anki_theme", True)
                         
                         if auto_sync_enabled and anki_theme_integration:
-                            # Use new comprehensive sync service
-                            sync_success = anki_theme_integration.sync_anki_theme(theme)
-                            if sync_success:
-                                print("✅ Advanced Anki theme sync completed")
-                            else:
-                                print("⚠️ Advanced sync failed, trying fallback method")
-                                # Fallback to original method
-                                is_dark = theme.get("type", "dark") == "dark"
-                                if hasattr(anki_theme_manager, 'set_night_mode'):
-                                    anki_theme_manager.set_night_mode(is_dark)
-                                    print(f"✅ Fallback Anki night mode: {is_dark}")
+                            # Use new comprehensive sync service (debounced, so
+                            # rapid theme switches only sync the last one)
+                            classified_type = None
+                            if ThemeClassificationService:
+                                # Cached per theme, so this skips re-classifying on every apply
+                                classified_type = ThemeClassificationService.get_theme_type_for_anki(
+                                    self.config["current_theme"], self.themes
+                                )
+                            # Falls back to set_night_mode itself if the deferred sync fails
+                            anki_theme_integration.sync_anki_theme(theme, classified_type=classified_type)
+                            print("✅ Advanced Anki theme sync scheduled")
                         else:
                             # Original method when auto-sync is disabled
                             is_dark = theme.get("type", "dark") == "dark"
@@ -786,6 +810,9 @@ class ThemeManager:
         self._css_cache.clear()
         self._qt_stylesheet_cache.clear()
         self._reviewer_css_cache.clear()
+        self._style_html_cache.clear()
+        if ThemeClassificationService:
+            ThemeClassificationService.invalidate_cache()
         self._cache_version += 1
         print(f"✅ All caches cleared, version bumped to {self._cache_version}")
         
@@ -18,13 +18,11 @@ class ThemeDialog(QDialog):
         
     def setup_ui(self):
         """Create the dialog UI"""
-        layout = QVBoxLayout()
-        self.setLayout(layout)
+        layout = QVBoxLayout(self)
         
         # Theme selection
         theme_group = QGroupBox("Select Theme")
-        theme_layout = QVBoxLayout()
-        theme_group.setLayout(theme_layout)
+        theme_layout = QVBoxLayout(theme_group)
         
         self.theme_list = QListWidget()
         self.theme_list.itemClicked.connect(self.on_theme_selected)
@@ -58,8 +56,7 @@ class ThemeDialog(QDialog):
         
         # Settings
         settings_group = QGroupBox("Settings")
-        settings_layout = QVBoxLayout()
-        settings_group.setLayout(settings_layout)
+        settings_layout = QVBoxLayout(settings_group)
         
         self.apply_to_cards_cb = QCheckBox("Apply theme to cards")
         self.apply_to_ui_cb = QCheckBox("Apply theme to Anki UI (requires restart)")
@@ -89,8 +86,7 @@ class ThemeDialog(QDialog):
         
         # Custom CSS
         custom_css_group = QGroupBox("Custom CSS (Advanced)")
-        custom_css_layout = QVBoxLayout()
-        custom_css_group.setLayout(custom_css_layout)
+        custom_css_layout = QVBoxLayout(custom_css_group)
         
         self.custom_css_text = QPlainTextEdit()
         self.custom_css_text.setMaximumHeight(100)